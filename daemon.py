@@ -3,14 +3,18 @@
 from gevent import Greenlet
 from sakura.common.tools import set_unbuffered_stdout, \
                                 wait_greenlets
+from sakura.common.log import configure_logging
+import sakura.daemon.conf as conf
 from sakura.daemon.loading import load_operator_classes
 from sakura.daemon.tools import connect_to_hub, \
-            get_daemon_id, set_daemon_id
+            get_daemon_id, set_daemon_id, negotiate_protocol
 from sakura.daemon.engine import DaemonEngine
 from sakura.daemon.greenlets import \
-            rpc_server_greenlet, rpc_client_greenlet
+            rpc_server_greenlet, rpc_client_greenlet, \
+            data_server_greenlet, cursors_greenlet
 
 set_unbuffered_stdout()
+configure_logging(conf)
 print('Started.')
 
 # load data, create engine
@@ -28,10 +32,18 @@ daemon_id = get_daemon_id(srv_sock_file)
 # comes from us too
 set_daemon_id(clt_sock_file, daemon_id)
 
+# select the RPC protocol of each connection
+srv_protocol = negotiate_protocol(srv_sock_file)
+clt_protocol = negotiate_protocol(clt_sock_file)
+
 # run greenlets and wait until they end.
-g1 = Greenlet.spawn(rpc_server_greenlet, srv_sock_file, engine)
-g2 = Greenlet.spawn(rpc_client_greenlet, clt_sock_file, engine)
-wait_greenlets(g1,g2)
+g1 = Greenlet.spawn(rpc_server_greenlet, srv_sock_file, srv_protocol, engine)
+g2 = Greenlet.spawn(rpc_client_greenlet, clt_sock_file, clt_protocol, engine)
+g3 = Greenlet.spawn(cursors_greenlet, engine)
+greenlets = [g1, g2, g3]
+if conf.data_port != None:
+    greenlets.append(Greenlet.spawn(data_server_greenlet, engine))
+wait_greenlets(*greenlets)
 print('**out**')
 
 # cleanup
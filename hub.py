@@ -7,6 +7,7 @@ from sakura.hub.web.greenlet import web_greenlet
 from sakura.hub.daemons.greenlet import daemons_greenlet
 from sakura.common.tools import set_unbuffered_stdout, \
                                 wait_greenlets
+from sakura.common.log import configure_logging
 import sakura.hub.conf as conf
 
 CURDIR = os.path.dirname(os.path.abspath(__file__))
@@ -22,6 +23,7 @@ def run(webapp_path):
 
 if __name__ == "__main__":
     set_unbuffered_stdout()
+    configure_logging(conf)
     print('Started.')
     webapp_path = CURDIR + '/' + conf.WEBAPP
     run(webapp_path)
@@ -0,0 +1,80 @@
+import pickle, struct
+
+# Length-prefixed framing of pickled messages.
+#
+# frame format:
+# - header: codec version (B), number of out-of-band buffers (H),
+#           length of the pickle payload (I)
+# - length of each out-of-band buffer (Q each)
+# - pickle payload (protocol 5)
+# - out-of-band buffers
+#
+# Large binary objects (e.g. numpy arrays of a Chunk) are sent as
+# out-of-band buffers: they are written to the socket and read back
+# without being copied into the pickle payload.
+# Since frames have a known length, a malformed message is read
+# entirely before it is rejected (see LocalAPIHandler for how it is
+# handled).
+
+HEADER = struct.Struct('!BHI')
+BUFFER_LENGTH = struct.Struct('!Q')
+
+class MalformedMessage(Exception):
+    pass
+
+def read_exactly(f, length):
+    buf = bytearray(length)
+    view = memoryview(buf)
+    pos = 0
+    while pos < length:
+        n = f.readinto(view[pos:])
+        if n == 0:
+            raise EOFError
+        pos += n
+    return buf
+
+class FramedPickleCodec(object):
+    VERSION = 1
+    def __init__(self):
+        self.name = 'framed-pickle-%d' % self.VERSION
+    def dump(self, obj, f):
+        buffers = []
+        def buffer_callback(pickle_buffer):
+            try:
+                buffers.append(pickle_buffer.raw())
+            except BufferError:
+                return True     # not contiguous, serialize in-band
+            return False
+        payload = pickle.dumps(obj, protocol = 5, buffer_callback = buffer_callback)
+        f.write(HEADER.pack(self.VERSION, len(buffers), len(payload)))
+        for buf in buffers:
+            f.write(BUFFER_LENGTH.pack(buf.nbytes))
+        f.write(payload)
+        for buf in buffers:
+            f.write(buf)
+    def load(self, f):
+        version, num_buffers, payload_length = HEADER.unpack(read_exactly(f, HEADER.size))
+        lengths = tuple(BUFFER_LENGTH.unpack(read_exactly(f, BUFFER_LENGTH.size))[0] \
+                        for i in range(num_buffers))
+        payload = read_exactly(f, payload_length)
+        buffers = tuple(read_exactly(f, length) for length in lengths)
+        # the whole frame was read, we can now reject it if needed
+        if version != self.VERSION:
+            raise MalformedMessage('unsupported codec version %d' % version)
+        try:
+            return pickle.loads(payload, buffers = buffers)
+        except Exception as e:
+            raise MalformedMessage(str(e))
+
+framed_pickle = FramedPickleCodec()
+
+# protocols which may be selected when a daemon connects to the hub,
+# by order of preference.
+PROTOCOLS = { framed_pickle.name: framed_pickle, 'pickle': pickle }
+PREFERRED_PROTOCOLS = (framed_pickle.name, 'pickle')
+
+def select_protocol(proposed_names):
+    for name in proposed_names:
+        if name in PROTOCOLS:
+            return name
+    return 'pickle'
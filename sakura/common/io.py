@@ -1,15 +1,22 @@
-import collections, itertools
+import collections, itertools, time, logging, gevent
 from gevent.queue import Queue
 from gevent.event import AsyncResult
+from gevent.lock import Semaphore
+from sakura.common.codec import MalformedMessage
+from sakura.common.metrics import rpc_metrics, CountingFile, path_key
+from sakura.common.log import Payload
+
+logger = logging.getLogger('sakura.rpc')
 
 ParsedRequest = collections.namedtuple('ParsedRequest',
                     ('req_id', 'path', 'args', 'kwargs'))
 
 class LocalAPIHandler(object):
     def __init__(self, f, protocol, local_api, greenlets_pool = None):
-        self.f = f
+        self.f = CountingFile(f)
         self.protocol = protocol
         self.api_runner = AttrCallRunner(local_api)
+        self.write_lock = Semaphore()
         if greenlets_pool == None:
             self.handle_request = self.handle_request_base
         else:
@@ -21,23 +28,53 @@ class LocalAPIHandler(object):
             if not should_continue:
                 break
     def handle_next_request(self):
+        bytes_in = self.f.bytes_in
         try:
             raw_req = self.protocol.load(self.f)
+        except MalformedMessage:
+            # framed protocol: the connection is still synchronized,
+            # but we cannot tell the caller (the request id is part
+            # of the payload), and it would wait for the result
+            # forever. Closing the connection makes its pending
+            # calls fail.
+            logger.warning('malformed request. closing.')
+            return False
+        except BaseException:
+            # usually, the connection was closed
+            logger.info('malformed request. closing.')
+            return False
+        try:
             req = ParsedRequest(*raw_req)
-            print('received', req)
         except BaseException:
-            print('malformed request. closing.')
+            # (same as above)
+            logger.warning('malformed request. closing.')
             return False
-        self.handle_request(*req)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('received %s', Payload(tuple(req)),
+                            extra = dict(path = path_key(req.path)))
+        self.handle_request(*req, self.f.bytes_in - bytes_in)
         return True
-    def handle_request_base(self, req_id, path, args, kwargs):
-        res = self.api_runner.do(path, args, kwargs)
+    def handle_request_base(self, req_id, path, args, kwargs, bytes_in = 0):
+        t0 = time.time()
+        if path == None:
+            # batch of calls (see AttrCallBatch)
+            res = self.api_runner.do_many(args)
+        else:
+            res = self.api_runner.do(path, args, kwargs)
         try:
-            self.protocol.dump((req_id, res), self.f)
-            print("sent",res)
-            self.f.flush()
+            # several greenlets of the pool may be sending
+            # responses concurrently.
+            with self.write_lock:
+                bytes_out = self.f.bytes_out
+                self.protocol.dump((req_id, res), self.f)
+                self.f.flush()
+                bytes_out = self.f.bytes_out - bytes_out
         except BaseException:
-            print('could not send response.')
+            logger.warning('could not send response.')
+            return
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('sent %s', Payload(res), extra = dict(path = path_key(path)))
+        rpc_metrics.record('served', path, time.time() - t0, bytes_in, bytes_out)
     def handle_request_pool(self, *args):
         self.pool.spawn(self.handle_request_base, *args)
 
@@ -92,33 +129,118 @@ class AttrCallRunner(object):
             else:
                 obj = obj[attr[0]]  # getitem
         return obj(*args, **kwargs)
+    def do_many(self, calls):
+        return [ self.do(path, args, kwargs) for path, args, kwargs in calls ]
+
+# AttrCallBatch allows to send several calls in a single request:
+#
+# batch = remote_api.batch()
+# batch.my.super.function(1, 2, a=3)
+# batch.my.other.function()
+# res1, res2 = batch.run()
+#
+# The calls are sent together and the remote end runs them using
+# AttrCallRunner.do_many().
+# batch.run_async() may be used instead of batch.run(), see below.
+
+class AttrCallBatch(AttrCallAggregator):
+    def __init__(self, forwarder):
+        super().__init__(self.queue)
+        self.forwarder = forwarder
+        self.calls = []
+    def queue(self, path, args, kwargs):
+        self.calls.append((path, args, kwargs))
+    def run_async(self):
+        calls, self.calls = self.calls, []
+        # a batch request has no path (see LocalAPIHandler)
+        return self.forwarder.handler_async(None, calls, {})
+    def run(self):
+        return self.run_async().get()
+
+# RemoteAPIForwarder blocks until the result of a call is received.
+# In order to issue several calls concurrently (e.g. to several
+# daemons), one can use remote_api.futures: calls made on it return
+# an AsyncResult immediately. Then, gather() waits for the results:
+#
+# res1, res2 = gather(
+#       daemon1_api.futures.my.function(),
+#       daemon2_api.futures.my.function())
+
+def gather(*async_results):
+    return [ async_res.get() for async_res in async_results ]
 
 class RemoteAPIForwarder(AttrCallAggregator):
     def __init__(self, f, protocol):
         super().__init__(self.handler)
-        self.f = f
+        self.f = CountingFile(f)
         self.protocol = protocol
         self.reqs = {}
         self.req_ids = itertools.count()
         self.running = False
+        self.closed = False     # set when loop() ends
+        self.write_lock = Semaphore()
+        self.flush_pending = False
+        self.futures = AttrCallAggregator(self.handler_async)
     def handler(self, path, args, kwargs):
+        return self.handler_async(path, args, kwargs).get()
+    def handler_async(self, path, args, kwargs):
         req_id = self.req_ids.__next__()
         async_res = AsyncResult()
-        self.reqs[req_id] = async_res
-        self.protocol.dump((req_id, path, args, kwargs), self.f)
-        self.f.flush()
+        if self.closed:
+            # nobody would ever receive the result
+            async_res.set_exception(ConnectionError('RPC connection closed.'))
+            return async_res
+        # the request must be registered before it is sent: send() may
+        # yield, and the result could be received meanwhile.
+        req = [ async_res, path, time.time(), 0 ]
+        self.reqs[req_id] = req
+        try:
+            req[3] = self.send((req_id, path, args, kwargs))  # bytes out
+        except BaseException:
+            self.reqs.pop(req_id, None)
+            raise
         # if the greenlet did not start the loop() method,
         # block until we get the result. (initialization phase)
         if not self.running:
             self.next_result()
-        return async_res.get()
+        return async_res
+    def batch(self):
+        return AttrCallBatch(self)
+    # returns the number of bytes sent
+    def send(self, req):
+        with self.write_lock:
+            bytes_out = self.f.bytes_out
+            self.protocol.dump(req, self.f)
+            bytes_out = self.f.bytes_out - bytes_out
+        if self.running:
+            # requests sent by other greenlets before the flush
+            # greenlet runs will share this flush.
+            if not self.flush_pending:
+                self.flush_pending = True
+                gevent.spawn(self.flush)
+        else:
+            self.f.flush()
+        return bytes_out
+    def flush(self):
+        with self.write_lock:
+            self.flush_pending = False
+            self.f.flush()
     def next_result(self):
+        bytes_in = self.f.bytes_in
         req_id, res = self.protocol.load(self.f)
-        async_res = self.reqs[req_id]
+        bytes_in = self.f.bytes_in - bytes_in
+        async_res, path, t0, bytes_out = self.reqs.pop(req_id)
+        rpc_metrics.record('forwarded', path, time.time() - t0, bytes_in, bytes_out)
         async_res.set(res)
-        del self.reqs[req_id]
     def loop(self):
         self.running = True
-        while True:
-            self.next_result()
+        try:
+            while True:
+                self.next_result()
+        finally:
+            # the connection is closed, pending calls fail.
+            self.closed = True
+            for async_res, path, t0, bytes_out in self.reqs.values():
+                async_res.set_exception(ConnectionError('RPC connection closed.'))
+            self.reqs = {}
 
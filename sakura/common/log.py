@@ -0,0 +1,61 @@
+import sys, atexit, queue, random, reprlib, logging
+from logging.handlers import QueueHandler, QueueListener
+
+# Logging of hub and daemon processes.
+#
+# Records are filtered by level and, for records related to an RPC
+# attribute path (extra = dict(path = ...)), sampled according to
+# the rate configured for this path.
+# Records that pass are formatted by the calling greenlet, then
+# written by a background thread, thus writing does not block the
+# gevent loop.
+#
+# Configuration keys (in the JSON conf file):
+# "log-level": "DEBUG", "INFO", "WARNING"... (default: INFO)
+# "log-sampling": { "<path>": <rate between 0 and 1>, "*": <default rate> }
+# "log-max-payload": max number of chars when rendering a payload (default: 200)
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+payload_repr = reprlib.Repr()
+payload_repr.maxlist = payload_repr.maxtuple = payload_repr.maxdict = 10
+payload_repr.maxstring = 60
+max_payload = 200
+
+# lazy and size-truncated rendering of a payload: this is only
+# computed if the record is actually written.
+class Payload(object):
+    def __init__(self, obj):
+        self.obj = obj
+    def __str__(self):
+        s = payload_repr.repr(self.obj)
+        if len(s) > max_payload:
+            s = s[:max_payload] + '...'
+        return s
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+        self.default_rate = self.rates.pop('*', 1.0)
+    def filter(self, record):
+        path = getattr(record, 'path', None)
+        if path == None:
+            return True
+        rate = self.rates.get(path, self.default_rate)
+        return rate >= 1.0 or random.random() < rate
+
+def configure_logging(conf):
+    global max_payload
+    max_payload = getattr(conf, 'log_max_payload', max_payload)
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(getattr(conf, 'log_sampling', {})))
+    writer = logging.StreamHandler(sys.__stdout__)
+    writer.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = QueueListener(log_queue, writer)
+    root = logging.getLogger()
+    root.setLevel(getattr(conf, 'log_level', 'INFO'))
+    root.addHandler(queue_handler)
+    listener.start()
+    atexit.register(listener.stop)
@@ -0,0 +1,92 @@
+# RPC metrics: number of calls, latency histogram and bytes
+# received and sent, per attribute path (e.g. 'op_instances.get_range',
+# indexes are omitted) and per channel:
+# - 'served': calls received by a LocalAPIHandler
+# - 'forwarded': calls sent by a RemoteAPIForwarder
+# Recording a call only involves a few integer operations, thus
+# metrics are always enabled.
+
+# bucket i of the latency histogram counts calls which took
+# less than 2^i microseconds (and more than 2^(i-1)).
+NUM_BUCKETS = 32
+
+def path_key(path):
+    if path == None:
+        return '<batch>'
+    return '.'.join(attr for attr in path if isinstance(attr, str))
+
+class PathMetrics(object):
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.histogram = [0] * NUM_BUCKETS
+        self.bytes_in = 0
+        self.bytes_out = 0
+    def record(self, duration, bytes_in, bytes_out):
+        self.calls += 1
+        self.total_time += duration
+        self.max_time = max(self.max_time, duration)
+        bucket = min(int(duration * 1000000).bit_length(), NUM_BUCKETS - 1)
+        self.histogram[bucket] += 1
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+    def get_serializable(self):
+        return dict(
+            calls = self.calls,
+            mean_time = self.total_time / self.calls,
+            max_time = self.max_time,
+            latency_histogram = { '<%dus' % (1 << bucket): count \
+                    for bucket, count in enumerate(self.histogram) if count > 0 },
+            bytes_in = self.bytes_in,
+            bytes_out = self.bytes_out)
+
+class RPCMetrics(object):
+    def __init__(self):
+        self.metrics = {}   # (channel, path key) -> PathMetrics
+    def record(self, channel, path, duration, bytes_in, bytes_out):
+        key = (channel, path_key(path))
+        path_metrics = self.metrics.get(key)
+        if path_metrics == None:
+            path_metrics = PathMetrics()
+            self.metrics[key] = path_metrics
+        path_metrics.record(duration, bytes_in, bytes_out)
+    def get_serializable(self):
+        res = {}
+        for (channel, key), path_metrics in self.metrics.items():
+            res.setdefault(channel, {})[key] = path_metrics.get_serializable()
+        return res
+
+# number of bytes of data: text (e.g. json on a GUI websocket) is
+# counted as its utf-8 encoding.
+def byte_length(data):
+    if isinstance(data, str):
+        return len(data.encode('utf-8'))
+    return len(data)
+
+# counts bytes read and written on a file-like object.
+class CountingFile(object):
+    def __init__(self, f):
+        self.f = f
+        self.bytes_in = 0
+        self.bytes_out = 0
+    def read(self, *args):
+        data = self.f.read(*args)
+        self.bytes_in += byte_length(data)
+        return data
+    def readline(self, *args):
+        data = self.f.readline(*args)
+        self.bytes_in += byte_length(data)
+        return data
+    def readinto(self, buf):
+        n = self.f.readinto(buf)
+        self.bytes_in += n
+        return n
+    def write(self, data):
+        self.bytes_out += byte_length(data)
+        return self.f.write(data)
+    def __getattr__(self, attr):
+        return getattr(self.f, attr)
+
+# per-process instance (hub or daemon)
+rpc_metrics = RPCMetrics()
@@ -1,11 +1,18 @@
 import sys, gevent
 
+# write and flush complete lines only. This avoids a flush per
+# write() call, and interleaving with the lines of the log writer
+# thread (see log.py).
 class StdoutProxy(object):
     def __init__(self, stdout):
         self.stdout = stdout
+        self.pending = ''
     def write(self, s):
-        self.stdout.write(s)
-        self.stdout.flush()
+        self.pending += s
+        if '\n' in s:
+            self.stdout.write(self.pending)
+            self.stdout.flush()
+            self.pending = ''
     def __getattr__(self, attr):
         return getattr(self.stdout, attr)
 
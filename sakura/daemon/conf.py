@@ -12,4 +12,22 @@ def load_conf():
     parser.add_argument('-d', '--daemon-desc',
                 help="Text line describying this sakura daemon",
                 type=str)
+    parser.add_argument('--data-port',
+                help="Port where other daemons may connect to pull data directly (default: disabled)",
+                type=int)
+    parser.add_argument('--data-host',
+                help="Address where the data port is bound (default: 127.0.0.1)",
+                type=str)
+    parser.add_argument('--stream-cache-size',
+                help="Memory budget of the stream cache, in megabytes (default: 0, disabled)",
+                type=int)
+    parser.add_argument('--process-pool-size',
+                help="Number of worker processes for operators running in the process pool (default: number of CPUs)",
+                type=int)
+    parser.add_argument('--max-partitions',
+                help="Max number of partitions of a source stream computed concurrently (default: process pool size, 1: disabled)",
+                type=int)
+    parser.add_argument('--datasets-cache-dir',
+                help="Where CSV files listed in external-datasets are converted to memory-mappable datasets (default: <tmp dir>/sakura-datasets)",
+                type=str)
     return merge_args_and_conf(parser)
@@ -1,21 +1,53 @@
+import itertools, time, hmac
 import sakura.daemon.conf as conf
 from sakura.daemon.processing.operator import Operator
+from sakura.daemon.processing.cache import stream_cache, \
+            DEFAULT_MAX_SIZE as DEFAULT_STREAM_CACHE_SIZE
+from sakura.daemon.processing.pool import process_pool
+from sakura.daemon.processing.partition import partition_planner
+from sakura.daemon.processing.query import StreamQuery
+from sakura.common.metrics import rpc_metrics
+from sakura.daemon.peers import PeerConnections
 from sakura.operators.internal.fragmentsource.operator import FragmentSourceOperator
 
+# cursors which were not used for this time are closed (e.g. the
+# consumer daemon died before reaching the end of the stream).
+CURSOR_IDLE_TIMEOUT = 300.0
+
 class DaemonEngine(object):
     def __init__(self, op_classes):
         self.op_classes = op_classes
         self.op_instances = {}
         self.hub = None
         self.fragment_sources = {}
+        self.cursors = {}
+        self.cursors_last_used = {}     # cursor_id -> time (None while fetching)
+        self.cursor_ids = itertools.count()
+        self.peers = PeerConnections()
+        self.data_token = None  # given by the hub (see data_server_greenlet)
+        cache_size = conf.stream_cache_size
+        if cache_size == None:
+            cache_size = DEFAULT_STREAM_CACHE_SIZE
+        stream_cache.configure(cache_size * 1000000)
+        process_pool.configure(conf.process_pool_size, conf.operators_dir)
+        partition_planner.configure(conf.max_partitions)
     def register_hub_api(self, hub_api):
         self.hub = hub_api
+    # other daemons connecting to our data port must send this token,
+    # which the hub only gives to the daemons it manages.
+    def set_data_token(self, token):
+        self.data_token = token
+    def check_data_token(self, token):
+        if self.data_token == None:
+            return False
+        return hmac.compare_digest(token, self.data_token.encode('ascii'))
     def get_daemon_info_serializable(self):
         op_classes_desc = list(
             Operator.descriptor(op_cls) for op_cls in self.op_classes.values()
         )
         return dict(name=conf.daemon_desc,
                     ext_datasets=conf.external_datasets,
+                    data_port=conf.data_port,
                     op_classes=op_classes_desc)
     def create_operator_instance(self, cls_name, op_id):
         op_cls = self.op_classes[cls_name]
@@ -26,6 +58,8 @@ class DaemonEngine(object):
         print("created operator %s op_id=%d" % (cls_name, op_id))
     def delete_operator_instance(self, op_id):
         print("deleting operator %s op_id=%d" % (self.op_instances[op_id].NAME, op_id))
+        # release cached results
+        self.op_instances[op_id].release()
         del self.op_instances[op_id]
     def is_foreign_operator(self, op_id):
         return op_id not in self.op_instances
@@ -33,9 +67,13 @@ class DaemonEngine(object):
         if self.is_foreign_operator(src_op_id):
             # the source is a remote operator.
             # we replace this source operator by an internal FragmentSourceOperator
-            # that will pull data from the hub and feed its unique output stream.
+            # that will pull data from the remote daemon (directly if possible,
+            # through the hub otherwise) and feed its unique output stream.
             src_label = 'remote(op_id=%d,out%d)' % (src_op_id, src_out_id)
-            src_op = FragmentSourceOperator(self.hub, src_op_id, src_out_id)
+            # ask the hub how to reach the daemon running src_op_id directly
+            endpoint = self.hub.get_peer_endpoint(src_op_id)
+            src_op = FragmentSourceOperator(self.hub, src_op_id, src_out_id,
+                                            self.peers, endpoint)
             src_op.construct()
             self.fragment_sources[(dst_op_id, dst_in_id)] = src_op
             # since src_op has been replaced (see above),
@@ -55,6 +93,60 @@ class DaemonEngine(object):
         dst_op.input_streams[dst_in_id].disconnect()
         if self.is_foreign_operator(src_op_id):
             # discard the fragment source operator
+            self.fragment_sources[(dst_op_id, dst_in_id)].release()
             del self.fragment_sources[(dst_op_id, dst_in_id)]
         print("disconnected [...] -> %s op_id=%d in%d" % \
                 (dst_op.NAME, dst_op_id, dst_in_id))
+    # the remote operator feeding this input changed (the hub
+    # calls this when a parameter or link changes upstream).
+    def invalidate_input(self, dst_op_id, dst_in_id):
+        self.fragment_sources[(dst_op_id, dst_in_id)].invalidate()
+    def get_cache_stats(self):
+        return stream_cache.get_stats()
+    def get_metrics(self):
+        return rpc_metrics.get_serializable()
+    # cursors allow a remote daemon to iterate over an output stream
+    # of this daemon, batch after batch, without restarting the
+    # computation at row 0 for each batch.
+    # query: serialized StreamQuery (see query.py), or None.
+    # returns the cursor id and the number of rows, if known.
+    def open_cursor(self, op_id, out_id, query = None):
+        cursor_id = next(self.cursor_ids)
+        stream = self.op_instances[op_id].output_streams[out_id]
+        query = StreamQuery.load(query)
+        self.cursors[cursor_id] = stream.rows(query)
+        self.cursors_last_used[cursor_id] = time.time()
+        length = None
+        if query == None or len(query.predicates) == 0:
+            length = stream.get_length()
+        return cursor_id, length
+    # returns None if the cursor does not exist (anymore).
+    def fetch(self, cursor_id, n):
+        it = self.cursors.get(cursor_id)
+        if it == None:
+            return None
+        self.cursors_last_used[cursor_id] = None
+        try:
+            rows = list(itertools.islice(it, n))
+        finally:
+            if cursor_id in self.cursors:
+                self.cursors_last_used[cursor_id] = time.time()
+            else:
+                it.close()  # closed while we were fetching
+        if len(rows) < n:
+            # end of stream
+            self.close_cursor(cursor_id)
+        return rows
+    def close_cursor(self, cursor_id):
+        it = self.cursors.pop(cursor_id, None)
+        last_used = self.cursors_last_used.pop(cursor_id, None)
+        # (if a fetch is running, fetch() will close the iterator)
+        if it != None and last_used != None:
+            it.close()
+    # called periodically (see cursors_greenlet)
+    def expire_cursors(self):
+        deadline = time.time() - CURSOR_IDLE_TIMEOUT
+        for cursor_id, last_used in tuple(self.cursors_last_used.items()):
+            if last_used != None and last_used < deadline:
+                print('closing idle cursor %d.' % cursor_id)
+                self.close_cursor(cursor_id)
@@ -1,11 +1,17 @@
 #!/usr/bin/env python3
 
-import pickle
-import gevent.pool
+import gevent, gevent.pool
+from gevent.server import StreamServer
 from sakura.common.io import LocalAPIHandler, \
                     RemoteAPIForwarder
+from sakura.common.codec import PROTOCOLS, select_protocol
+from sakura.daemon.peers import DaemonToDaemonAPI
+import sakura.daemon.conf as conf
 
-def rpc_server_greenlet(sock_file, engine):
+CURSORS_SWEEP_PERIOD = 60.0
+DEFAULT_DATA_HOST = '127.0.0.1'
+
+def rpc_server_greenlet(sock_file, protocol, engine):
     # instruct the hub that we will manage this connection
     # as a RPC server (i.e. the hub should be client)
     sock_file.write(b'RPC_SERVER\n')
@@ -13,16 +19,56 @@ def rpc_server_greenlet(sock_file, engine):
     # handle this RPC API
     pool = gevent.pool.Group()
     local_api = engine
-    handler = LocalAPIHandler(sock_file, pickle, local_api, pool)
+    handler = LocalAPIHandler(sock_file, protocol, local_api, pool)
     handler.loop()
 
-def rpc_client_greenlet(sock_file, engine):
+def rpc_client_greenlet(sock_file, protocol, engine):
     # instruct the hub that we will use this connection as
     # a RPC client (i.e. the hub should be server)
     sock_file.write(b'RPC_CLIENT\n')
     sock_file.flush()
     # this greenlet should forward API calls over
     # the connection towards the hub.
-    remote_api = RemoteAPIForwarder(sock_file, pickle)
+    remote_api = RemoteAPIForwarder(sock_file, protocol)
     engine.register_hub_api(remote_api)
     remote_api.loop()
+
+def data_server_greenlet(engine):
+    # other daemons may connect here to pull data directly
+    # (see peers.py)
+    def handle(socket, address):
+        sock_file = socket.makefile(mode='rwb')
+        # the client starts by sending the token the hub gave it,
+        # then it selects the protocol
+        words = sock_file.readline().strip().split()
+        if len(words) != 2 or words[0] != b'TOKEN' or \
+                    not engine.check_data_token(words[1]) or \
+                    sock_file.readline().strip() != b'PROTOCOL':
+            print('rejected data connection from %s:%d.' % address[:2])
+            sock_file.close()
+            socket.close()
+            return
+        proposed = sock_file.readline().strip().decode("ascii").split()
+        protocol_name = select_protocol(proposed)
+        sock_file.write((protocol_name + '\n').encode("ascii"))
+        sock_file.flush()
+        pool = gevent.pool.Group()
+        local_api = DaemonToDaemonAPI(engine)
+        handler = LocalAPIHandler(sock_file, PROTOCOLS[protocol_name], local_api, pool)
+        try:
+            handler.loop()
+        finally:
+            local_api.close()
+            socket.close()
+    data_host = conf.data_host
+    if data_host == None:
+        data_host = DEFAULT_DATA_HOST
+    print('data port listening on %s:%d.' % (data_host, conf.data_port))
+    server = StreamServer((data_host, conf.data_port), handle)
+    server.serve_forever()
+
+def cursors_greenlet(engine):
+    # close cursors which are not used anymore (see engine.py)
+    while True:
+        gevent.sleep(CURSORS_SWEEP_PERIOD)
+        engine.expire_cursors()
@@ -1,27 +1,104 @@
-import sys, os, importlib, inspect
+import sys, os, json, importlib, inspect
 from sakura.daemon.processing.operator import Operator
 import sakura.daemon.conf as conf
 
+# Operator modules are only imported when the first instance
+# is created. Until then, the description of operator classes
+# (NAME, SHORT_DESC, TAGS, ICON) is read from an index file stored
+# in operators_dir. An entry of this index is valid as long as
+# operator.py and icon.svg of the operator directory are not
+# modified, otherwise the module is imported to update it.
+
+INDEX_FILE = '.index.json'
+INDEX_VERSION = 1
+
+def import_operator_module(op_dir):
+    sys.path.insert(0, conf.operators_dir)
+    try:
+        return importlib.import_module(op_dir + '.operator')
+    finally:
+        sys.path.remove(conf.operators_dir)
+
+# look for the Operator subclasses defined in this module
+def get_operator_classes(mod):
+    def match(obj):
+        return  inspect.isclass(obj) and \
+                inspect.getmodule(obj) == mod and \
+                issubclass(obj, Operator)
+    return inspect.getmembers(mod, match)
+
+# stands for an operator class until an instance is created.
+class LazyOperatorClass(object):
+    def __init__(self, op_dir, attr_name, name, short_desc, tags, icon):
+        self.op_dir = op_dir
+        self.attr_name = attr_name
+        self.NAME = name
+        self.SHORT_DESC = short_desc
+        self.TAGS = tags
+        self.ICON = icon
+        self.op_cls = None
+    def load(self):
+        if self.op_cls == None:
+            print('Importing operator %s' % self.NAME)
+            mod = import_operator_module(self.op_dir)
+            self.op_cls = getattr(mod, self.attr_name)
+            self.op_cls.ICON = self.ICON
+        return self.op_cls
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+def get_mtimes(op_path):
+    return { file_name: os.path.getmtime(op_path + '/' + file_name) \
+                for file_name in ('operator.py', 'icon.svg') }
+
+def read_index(index_path):
+    try:
+        with open(index_path, 'r') as index_file:
+            index = json.load(index_file)
+    except (OSError, ValueError):
+        return {}
+    if index.get('version') != INDEX_VERSION:
+        return {}
+    return index['operators']
+
+def write_index(index_path, entries):
+    try:
+        with open(index_path, 'w') as index_file:
+            json.dump(dict(version = INDEX_VERSION, operators = entries), index_file)
+    except OSError:
+        print('warning: could not write operators index at %s.' % index_path)
+
+# import the module and describe its operator classes
+def index_operator_dir(op_dir, op_path, mtimes):
+    mod = import_operator_module(op_dir)
+    with open(op_path + '/icon.svg', 'r') as icon_file:
+        icon = icon_file.read()
+    classes = [ [attr_name, op_cls.NAME, op_cls.SHORT_DESC, op_cls.TAGS] \
+                    for attr_name, op_cls in get_operator_classes(mod) ]
+    return dict(mtimes = mtimes, icon = icon, classes = classes)
+
 def load_operator_classes():
     print('Loading operators at %s' % conf.operators_dir)
+    index_path = conf.operators_dir + '/' + INDEX_FILE
+    old_entries = read_index(index_path)
+    entries = {}
     op_classes = {}
-    sys.path.insert(0, conf.operators_dir)
     # for each operator directory
-    for op_dir in os.listdir(conf.operators_dir):
-        # load the module defined by operator.py
-        mod = importlib.import_module(op_dir + '.operator')
-        # look for the Operator subclass defined in this module
-        def match(obj):
-            return  inspect.isclass(obj) and \
-                    inspect.getmodule(obj) == mod and \
-                    issubclass(obj, Operator)
-        matches = inspect.getmembers(mod, match)
-        if len(matches) == 0:
+    for op_dir in sorted(os.listdir(conf.operators_dir)):
+        op_path = conf.operators_dir + '/' + op_dir
+        if not os.path.isfile(op_path + '/operator.py'):
+            continue
+        mtimes = get_mtimes(op_path)
+        entry = old_entries.get(op_dir)
+        if entry == None or entry['mtimes'] != mtimes:
+            entry = index_operator_dir(op_dir, op_path, mtimes)
+        entries[op_dir] = entry
+        if len(entry['classes']) == 0:
             print("warning: no subclass of Operator found in %s/operator.py. Ignoring." % op_dir)
             continue
-        for name, op_cls in matches:
-            with open(conf.operators_dir + '/' + op_dir + '/icon.svg', 'r') as icon_file:
-                op_cls.ICON = icon_file.read()
+        for cls_desc in entry['classes']:
+            op_cls = LazyOperatorClass(op_dir, *cls_desc, entry['icon'])
             op_classes[op_cls.NAME] = op_cls
-    sys.path = sys.path[1:]
+    if entries != old_entries:
+        write_index(index_path, entries)
     return op_classes
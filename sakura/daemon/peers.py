@@ -0,0 +1,88 @@
+import time, gevent
+from gevent.socket import create_connection
+from sakura.common.io import RemoteAPIForwarder
+from sakura.daemon.tools import negotiate_protocol
+
+# When 2 operators running on different daemons are linked, data can
+# flow directly between the 2 daemons, instead of being relayed by the
+# hub: each daemon may listen on a data port (see data_server_greenlet),
+# and the hub tells the daemon of the destination operator how to reach
+# the daemon of the source operator.
+# If this direct connection cannot be established, data is relayed
+# by the hub.
+# The data port is disabled by default. It is bound to the address
+# given by the data-host option (default: 127.0.0.1). A daemon
+# connecting to it must first send a token which the hub generated
+# for the daemon listening, and only gives to the daemons it manages.
+
+PEER_CONNECT_TIMEOUT = 2.0
+PEER_RETRY_DELAY = 30.0
+
+# API offered to other daemons on the data port.
+# one instance per connection: when the connection is closed, the
+# cursors opened by the remote daemon are closed too.
+class DaemonToDaemonAPI(object):
+    def __init__(self, engine):
+        self.engine = engine
+        self.cursor_ids = set()
+    def open_cursor(self, op_id, out_id, query = None):
+        cursor_id, length = self.engine.open_cursor(op_id, out_id, query)
+        self.cursor_ids.add(cursor_id)
+        return cursor_id, length
+    def fetch(self, cursor_id, n):
+        return self.engine.fetch(cursor_id, n)
+    def close_cursor(self, cursor_id):
+        self.cursor_ids.discard(cursor_id)
+        return self.engine.close_cursor(cursor_id)
+    def close(self):
+        for cursor_id in tuple(self.cursor_ids):
+            self.close_cursor(cursor_id)
+
+# connections to the data port of other daemons.
+# if a daemon cannot be reached, data is relayed by the hub, and we
+# try to connect again after PEER_RETRY_DELAY.
+class PeerConnections(object):
+    def __init__(self):
+        self.apis = {}      # (host, port, token) -> RemoteAPIForwarder
+        self.failures = {}  # (host, port, token) -> time of the last failed attempt
+    def get_api(self, endpoint):
+        endpoint = tuple(endpoint)
+        if endpoint not in self.apis:
+            failure = self.failures.get(endpoint)
+            if failure != None and time.time() < failure + PEER_RETRY_DELAY:
+                return None
+            if self.connect(endpoint) == None:
+                self.failures[endpoint] = time.time()
+                return None
+            self.failures.pop(endpoint, None)
+        # (None if the connection was closed already)
+        return self.apis.get(endpoint)
+    def connect(self, endpoint):
+        try:
+            host, port, token = endpoint
+            sock = create_connection((host, port), timeout = PEER_CONNECT_TIMEOUT)
+            sock.settimeout(None)
+            sock_file = sock.makefile(mode='rwb')
+            sock_file.write(('TOKEN %s\n' % token).encode('ascii'))
+            protocol = negotiate_protocol(sock_file)
+        except (OSError, KeyError):
+            # (KeyError: connection closed before the protocol was
+            # selected, e.g. token rejected)
+            print('could not connect to daemon at %s:%d, data will be relayed by the hub.' % endpoint[:2])
+            return None
+        print('connected to daemon at %s:%d.' % endpoint[:2])
+        api = RemoteAPIForwarder(sock_file, protocol)
+        self.apis[endpoint] = api
+        gevent.spawn(self.run, endpoint, api)
+        # let the loop start before any call is issued
+        gevent.sleep(0)
+        return api
+    def run(self, endpoint, api):
+        try:
+            api.loop()
+        except BaseException:
+            pass
+        print('connection to daemon at %s:%d closed.' % endpoint[:2])
+        # next call to get_api() will reconnect
+        if self.apis.get(endpoint) is api:
+            del self.apis[endpoint]
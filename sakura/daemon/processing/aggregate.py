@@ -0,0 +1,256 @@
+import sys, math
+import numpy as np
+from sakura.daemon.processing.operator import Operator
+from sakura.daemon.processing.parameter import NumericColumnSelection
+
+# Aggregates of a numeric column.
+# An aggregate object holds the partial state of the computation:
+# - update(array) processes a chunk of values (numpy array)
+# - merge(other) adds the partial state of another aggregate
+#   object of the same class (e.g. computed on another range of
+#   rows, in another process or on another daemon)
+# - rows() returns the result, as rows described by COLUMNS
+#   (LENGTH rows, or an unknown number of rows if LENGTH is None).
+# Null values (None or NaN) and infinite values are ignored. On an
+# empty input, results are None (except counts).
+
+def numeric_values(array):
+    if array.dtype.kind == 'O':
+        # e.g. an int column with None values (see chunk.py)
+        array = np.where(array == None, np.nan, array)
+    if array.dtype.kind not in 'iuf':
+        array = array.astype(np.float64)
+    if array.dtype.kind == 'f':
+        array = array[np.isfinite(array)]
+    return array
+
+def to_python(value):
+    if value == None:
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+class Count(object):
+    COLUMNS = (('Count', int),)
+    LENGTH = 1
+    def __init__(self):
+        self.count = 0
+    def update(self, array):
+        self.count += len(numeric_values(array))
+    def merge(self, other):
+        self.count += other.count
+    def rows(self):
+        return [ (self.count,) ]
+
+# (accumulated as float64: the sum of an int column may overflow int64)
+class Sum(object):
+    COLUMNS = (('Sum', float),)
+    LENGTH = 1
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+    def update(self, array):
+        array = numeric_values(array)
+        self.total += float(array.sum(dtype = np.float64))
+        self.count += len(array)
+    def merge(self, other):
+        self.total += other.total
+        self.count += other.count
+    def rows(self):
+        if self.count == 0:
+            return [ (None,) ]
+        return [ (self.total,) ]
+
+class Mean(object):
+    COLUMNS = (('Mean', float),)
+    LENGTH = 1
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+    def update(self, array):
+        array = numeric_values(array)
+        self.total += float(array.sum(dtype = np.float64))
+        self.count += len(array)
+    def merge(self, other):
+        self.total += other.total
+        self.count += other.count
+    def rows(self):
+        if self.count == 0:
+            return [ (None,) ]
+        return [ (float(self.total) / self.count,) ]
+
+class MinMax(object):
+    COLUMNS = (('Min', float), ('Max', float))
+    LENGTH = 1
+    def __init__(self):
+        self.min = None
+        self.max = None
+    def update_range(self, vmin, vmax):
+        if self.min == None:
+            self.min, self.max = vmin, vmax
+        else:
+            self.min, self.max = min(self.min, vmin), max(self.max, vmax)
+    def update(self, array):
+        array = numeric_values(array)
+        if len(array) > 0:
+            self.update_range(array.min(), array.max())
+    def merge(self, other):
+        if other.min != None:
+            self.update_range(other.min, other.max)
+    def rows(self):
+        return [ (to_python(self.min), to_python(self.max)) ]
+
+# population variance, computed with the parallel algorithm of
+# Chan et al. (each chunk is a partial state merged into ours).
+class Variance(object):
+    COLUMNS = (('Variance', float), ('Standard deviation', float))
+    LENGTH = 1
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0       # sum of squared differences to the mean
+    def merge_state(self, count, mean, m2):
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+    def update(self, array):
+        array = numeric_values(array).astype(np.float64)
+        if len(array) > 0:
+            mean = float(array.mean())
+            self.merge_state(len(array), mean, float(((array - mean) ** 2).sum()))
+    def merge(self, other):
+        self.merge_state(other.count, other.mean, other.m2)
+    def rows(self):
+        if self.count == 0:
+            return [ (None, None) ]
+        variance = self.m2 / self.count
+        return [ (variance, math.sqrt(variance)) ]
+
+# histogram with HISTOGRAM_BINS bins of the same width.
+# the range of values is not known in advance, thus the bin width
+# is a power of 2, doubled (and pairs of bins merged) each time
+# values fall out of the current range (the range of bins may also
+# move towards these values). The lower bound is a multiple
+# of the width, thus the bins of two histograms are always aligned
+# and can be merged.
+# Bins are described by integers: bin i covers values in
+# [(first + i) * 2 ** exponent, (first + i + 1) * 2 ** exponent[.
+# Thus computations do not overflow with values close to the
+# largest floats.
+HISTOGRAM_BINS = 64
+MIN_EXPONENT = -1000    # (smaller bin widths would underflow)
+
+class Histogram(object):
+    COLUMNS = (('Bin start', float), ('Bin end', float), ('Count', int))
+    LENGTH = None
+    def __init__(self, num_bins = HISTOGRAM_BINS):
+        self.num_bins = num_bins
+        self.counts = np.zeros(num_bins, np.int64)
+        self.first = None
+        self.exponent = None
+    def widen(self):
+        first = self.first // 2
+        offset = self.first - first * 2     # 0 or 1
+        new_bins = (np.arange(self.num_bins) + offset) // 2
+        self.counts = np.bincount(new_bins, weights = self.counts,
+                                  minlength = self.num_bins).astype(np.int64)
+        self.first, self.exponent = first, self.exponent + 1
+    def bin_index(self, value):
+        return math.floor(math.ldexp(value, -self.exponent))
+    # initial range: values between vmin and vmax (finite)
+    def fit(self, vmin, vmax):
+        # (vmax - vmin may overflow)
+        span = vmax / (self.num_bins - 1) - vmin / (self.num_bins - 1)
+        self.exponent = max(math.ceil(math.log2(span)), MIN_EXPONENT) if span > 0 else 0
+        self.first = self.bin_index(vmin)
+        while self.bin_index(vmax) >= self.first + self.num_bins:
+            self.widen()    # (rounding errors)
+    def add(self, values):
+        bins = np.floor(np.ldexp(values, -self.exponent)) - float(self.first)
+        bins = np.clip(bins.astype(np.int64), 0, self.num_bins - 1)  # (rounding errors)
+        self.counts += np.bincount(bins, minlength = self.num_bins)
+    def update(self, array):
+        array = numeric_values(array).astype(np.float64)
+        if len(array) > 0:
+            chunk = Histogram(self.num_bins)
+            chunk.fit(float(array.min()), float(array.max()))
+            chunk.add(array)
+            self.merge(chunk)
+    def used_range(self):
+        used = np.nonzero(self.counts)[0]
+        return self.first + int(used[0]), self.first + int(used[-1])
+    # move the range of bins, to start at bin index first
+    def rebase(self, first):
+        used = np.nonzero(self.counts)[0]
+        counts = np.zeros(self.num_bins, np.int64)
+        counts[used + (self.first - first)] = self.counts[used]
+        self.counts, self.first = counts, first
+    def merge(self, other):
+        if other.first == None:
+            return
+        if self.first == None:
+            self.num_bins = other.num_bins
+            self.counts = other.counts.copy()
+            self.first, self.exponent = other.first, other.exponent
+            return
+        while self.exponent < other.exponent:
+            self.widen()
+        # (the bins of other, at our bin width)
+        other_start, other_end = other.used_range()
+        while True:
+            shift = self.exponent - other.exponent
+            start, end = self.used_range()
+            start = min(start, other_start >> shift)
+            end = max(end, other_end >> shift)
+            if end - start < self.num_bins:
+                break
+            self.widen()
+        # (keep our first bin if possible)
+        self.rebase(min(max(self.first, end - self.num_bins + 1), start))
+        bins = [ ((other.first + i) >> shift) - self.first \
+                    for i in range(other_start - other.first, other_end - other.first + 1) ]
+        self.counts += np.bincount(bins,
+                    weights = other.counts[other_start - other.first:other_end - other.first + 1],
+                    minlength = self.num_bins).astype(np.int64)
+    def bound(self, index):
+        try:
+            return math.ldexp(index, self.exponent)
+        except OverflowError:
+            return math.copysign(sys.float_info.max, index)
+    def rows(self):
+        if self.first == None:
+            return []
+        # omit empty bins at both ends
+        used = np.nonzero(self.counts)[0]
+        return [ (self.bound(self.first + i), self.bound(self.first + i + 1),
+                  int(self.counts[i])) for i in range(used[0], used[-1] + 1) ]
+
+# base class of operators computing an aggregate of a numeric
+# column of their input.
+# subclasses just have to define NAME, SHORT_DESC, TAGS and
+# AGGREGATE (one of the aggregate classes above).
+# partial results computed on partitions of the input are
+# merged (see partition.py).
+class AggregateOperator(Operator):
+    PARTITION_SAFE = True
+    def construct(self):
+        # inputs
+        self.input = self.register_input('%s input data' % self.NAME)
+        # outputs
+        output = self.register_output('%s result' % self.NAME, self.compute)
+        for col_label, col_type in self.AGGREGATE.COLUMNS:
+            output.add_column(col_label, col_type)
+        output.length = self.AGGREGATE.LENGTH
+        # parameters
+        self.input_column = self.register_parameter('Input column',
+                NumericColumnSelection(self.input))
+    def compute_partial(self):
+        aggregate = self.AGGREGATE()
+        for chunk in self.input_column.chunks():
+            aggregate.update(chunk)
+        return aggregate
+    def compute(self):
+        yield from self.compute_partial().rows()
@@ -0,0 +1,114 @@
+import sys, collections
+from sakura.daemon.processing.chunk import Chunk
+
+# Cache of computed stream contents.
+# When a stream is fully iterated, the items (rows or chunks) output
+# by its compute_cb() are recorded, and later iterations or range
+# reads of this stream are served from memory.
+# The total size of the entries is bounded by max_size (in bytes),
+# least recently used entries are evicted first.
+# A max_size of 0 disables the cache (the default: the cache is
+# optional, see --stream-cache-size).
+# Entries are keyed by the state of the stream (see
+# OutputStream.get_state(), computed once per generation of the
+# stream), which includes the parameter values of
+# its operator and the state of the operators upstream. Thus, when a
+# parameter changes, the entries of the streams downstream are not
+# used anymore, but the ones upstream still are. And if the parameter
+# is set back to its previous value, the previous entries are used
+# again (if they were not evicted meanwhile).
+# Entries of a stream are dropped when its operator is deleted.
+
+DEFAULT_MAX_SIZE = 0        # megabytes
+
+def estimate_size(item):
+    if isinstance(item, Chunk):
+        return item.nbytes
+    return sys.getsizeof(item) + sum(sys.getsizeof(val) for val in item)
+
+class StreamCacheRecorder(object):
+    def __init__(self, cache, stream):
+        self.cache = cache
+        self.stream = stream
+        self.key = stream.get_state()
+        self.generation = stream.generation
+        self.items = []
+        self.size = 0
+        self.row_size = None
+    def add(self, item):
+        if self.items == None:
+            return  # recording aborted
+        if isinstance(item, Chunk):
+            self.size += item.nbytes
+        else:
+            # estimate the size of the 1st row only
+            if self.row_size == None:
+                self.row_size = estimate_size(item)
+            self.size += self.row_size
+        if self.size > self.cache.max_size:
+            self.items = None   # too large, abort
+            return
+        self.items.append(item)
+    def done(self):
+        # if the stream was invalidated while we were iterating,
+        # the recorded items are obsolete.
+        if self.items != None and self.stream.generation == self.generation:
+            self.cache.store(self.key, self.items, self.size)
+
+class StreamCache(object):
+    def __init__(self, max_size = 0):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()    # state -> (items, size)
+        self.size = 0
+        self.hits, self.misses, self.evictions = 0, 0, 0
+    def configure(self, max_size):
+        self.max_size = max_size
+        self.shrink()
+    def enabled(self):
+        return self.max_size > 0
+    def get(self, stream):
+        if not self.enabled():
+            return None
+        key = stream.get_state()
+        entry = self.entries.get(key)
+        if entry == None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+    # (without updating hits and misses)
+    def contains(self, stream):
+        return self.enabled() and stream.get_state() in self.entries
+    def recorder(self, stream):
+        return StreamCacheRecorder(self, stream)
+    def store(self, key, items, size):
+        self.drop(key)
+        self.entries[key] = (items, size)
+        self.size += size
+        self.shrink()
+    def drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry != None:
+            self.size -= entry[1]
+    # drop the entries of this stream, whatever its state
+    def invalidate(self, stream):
+        # (keys start with the stream, see OutputStream.get_state())
+        for key in [ key for key in self.entries if key[0] is stream ]:
+            self.drop(key)
+    def shrink(self):
+        while self.size > self.max_size:
+            key, (items, size) = self.entries.popitem(last = False)
+            self.size -= size
+            self.evictions += 1
+    def get_stats(self):
+        return dict(max_size = self.max_size,
+                    size = self.size,
+                    entries = len(self.entries),
+                    hits = self.hits,
+                    misses = self.misses,
+                    evictions = self.evictions)
+
+# per-daemon cache instance.
+# it is disabled until the daemon engine configures it.
+stream_cache = StreamCache()
@@ -0,0 +1,48 @@
+import numpy as np
+
+# Operators may yield chunks instead of rows in their compute
+# callbacks. A chunk is a column-oriented batch of rows, with
+# one numpy array per column of the stream.
+# This avoids the per-row overhead of the python interpreter
+# when processing large streams.
+
+DEFAULT_CHUNK_SIZE = 4096
+
+# numpy type used to store the values of a column, given the
+# python type declared for this column.
+# other types (e.g. str) are stored as python objects.
+NUMPY_TYPES = { int: np.int64, float: np.float64, bool: np.bool_ }
+
+def numpy_type(col_type):
+    return NUMPY_TYPES.get(col_type, object)
+
+# values may be None (missing values). In a float column they are
+# stored as NaN. numpy would silently convert them to 0 or False
+# (or fail) in an int or bool column, thus such a column is stored
+# as python objects.
+def column_array(values, dtype):
+    if dtype in (np.int64, np.bool_) and None in values:
+        return np.array(values, object)
+    return np.array(values, dtype)
+
+class Chunk(object):
+    def __init__(self, arrays):
+        self.arrays = tuple(arrays)
+    def __len__(self):
+        if len(self.arrays) == 0:
+            return 0
+        return len(self.arrays[0])
+    def __getitem__(self, row_slice):
+        return Chunk(arr[row_slice] for arr in self.arrays)
+    @property
+    def nbytes(self):
+        return sum(arr.nbytes for arr in self.arrays)
+    def rows(self):
+        # tolist() converts values to python types
+        return zip(*(arr.tolist() for arr in self.arrays))
+    @staticmethod
+    def from_rows(rows, columns):
+        if len(rows) == 0:
+            return Chunk(np.empty(0, col.dtype) for col in columns)
+        return Chunk(column_array(values, col.dtype) \
+                        for values, col in zip(zip(*rows), columns))
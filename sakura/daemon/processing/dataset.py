@@ -0,0 +1,157 @@
+import os, csv, json, hashlib, itertools, gevent
+import numpy as np
+from numpy.lib.format import open_memmap
+from sakura.daemon.processing.chunk import Chunk
+
+# On-disk columnar datasets.
+# A dataset is a directory with a file schema.json:
+# {
+#   "length": <number of rows>,
+#   "columns": [ { "label": "...", "type": "int", "file": "col0.npy" }, ... ]
+# }
+# and one .npy file per column. Column types are "int", "float",
+# "bool" or "str" (str columns are stored with a fixed-width unicode
+# dtype, thus they can be memory-mapped too).
+#
+# Column files are memory-mapped: reading a range of rows of some of
+# the columns only reads the corresponding parts of the files.
+#
+# CSV files can be used too: they are converted to a dataset directory
+# (in a cache directory) the first time they are used, or when they
+# were modified since the conversion.
+# The conversion runs in a thread, thus the daemon still handles
+# requests meanwhile. Concurrent requests for the same file wait for
+# the same conversion.
+
+SCHEMA_FILE = 'schema.json'
+COLUMN_TYPES = { 'int': int, 'float': float, 'bool': bool, 'str': str }
+NUMPY_DTYPES = { 'int': np.int64, 'float': np.float64, 'bool': np.bool_ }
+
+class MappedDataset(object):
+    def __init__(self, path):
+        with open(os.path.join(path, SCHEMA_FILE)) as schema_file:
+            schema = json.load(schema_file)
+        self.length = schema['length']
+        self.columns = [ (col['label'], COLUMN_TYPES[col['type']]) \
+                            for col in schema['columns'] ]
+        self.arrays = [ np.load(os.path.join(path, col['file']), mmap_mode = 'r') \
+                            for col in schema['columns'] ]
+    # chunks of rows [row_start, row_end[, restricted to the given
+    # column indexes (all columns by default).
+    def chunks(self, row_start, row_end, chunk_size, col_indexes = None):
+        arrays = self.arrays
+        if col_indexes != None:
+            arrays = [ arrays[idx] for idx in col_indexes ]
+        row_end = min(row_end, self.length)
+        for chunk_start in range(row_start, row_end, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, row_end)
+            yield Chunk(arr[chunk_start:chunk_end] for arr in arrays)
+
+# CSV conversion
+# --------------
+# the first line gives the column labels. A column is 'int' if all
+# values are integers, 'float' if all values are numbers (empty values
+# are allowed and converted to NaN), 'str' otherwise.
+def infer_type(col_type, value):
+    if col_type == 'str':
+        return 'str'
+    if value == '':
+        return 'float'
+    if col_type == 'int':
+        try:
+            int(value)
+            return 'int'
+        except ValueError:
+            pass
+    try:
+        float(value)
+        return 'float'
+    except ValueError:
+        return 'str'
+
+CONVERT_BATCH_ROWS = 65536
+
+# returns the column labels and an iterator over the rows
+# (with missing values set to '')
+def read_csv(csv_file):
+    reader = csv.reader(csv_file)
+    labels = next(reader)
+    def rows():
+        for row in reader:
+            if len(row) != len(labels):
+                row = (row + [ '' ] * len(labels))[:len(labels)]
+            yield row
+    return labels, rows()
+
+def convert_csv(csv_path, dataset_path):
+    # 1st pass: column types, max length of strings, number of rows
+    with open(csv_path, newline = '') as csv_file:
+        labels, rows = read_csv(csv_file)
+        col_types = [ 'int' ] * len(labels)
+        str_lengths = [ 1 ] * len(labels)
+        length = 0
+        for row in rows:
+            length += 1
+            for idx, value in enumerate(row):
+                col_types[idx] = infer_type(col_types[idx], value)
+                str_lengths[idx] = max(str_lengths[idx], len(value))
+    # 2nd pass: write column files
+    os.makedirs(dataset_path, exist_ok = True)
+    columns, arrays = [], []
+    for idx, (label, col_type) in enumerate(zip(labels, col_types)):
+        file_name = 'col%d.npy' % idx
+        dtype = NUMPY_DTYPES.get(col_type, 'U%d' % str_lengths[idx])
+        arrays.append(open_memmap(os.path.join(dataset_path, file_name),
+                                  mode = 'w+', dtype = dtype, shape = (length,)))
+        columns.append(dict(label = label, type = col_type, file = file_name))
+    with open(csv_path, newline = '') as csv_file:
+        labels, rows = read_csv(csv_file)
+        row_start = 0
+        while row_start < length:
+            batch = list(itertools.islice(rows, CONVERT_BATCH_ROWS))
+            row_end = row_start + len(batch)
+            for array, col_type, values in zip(arrays, col_types, zip(*batch)):
+                if col_type == 'float':
+                    values = [ 'nan' if value == '' else value for value in values ]
+                array[row_start:row_end] = np.array(values).astype(array.dtype)
+            row_start = row_end
+    for array in arrays:
+        array.flush()
+    # the schema is written last: its presence means the conversion
+    # is complete.
+    with open(os.path.join(dataset_path, SCHEMA_FILE), 'w') as schema_file:
+        json.dump(dict(length = length, columns = columns), schema_file)
+
+conversions = {}    # dataset_path -> result of the running conversion
+
+def convert_csv_in_thread(csv_path, dataset_path):
+    conversion = conversions.get(dataset_path)
+    if conversion == None:
+        conversion = gevent.get_hub().threadpool.spawn(convert_csv, csv_path, dataset_path)
+        conversions[dataset_path] = conversion
+        conversion.rawlink(lambda result: conversions.pop(dataset_path, None))
+    conversion.get()
+
+def converted_path(csv_path, cache_dir):
+    csv_path = os.path.abspath(csv_path)
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    digest = hashlib.sha1(csv_path.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_dir, '%s-%s' % (name, digest))
+
+def open_dataset(path, cache_dir):
+    if os.path.isdir(path):
+        return MappedDataset(path)
+    # CSV file
+    dataset_path = converted_path(path, cache_dir)
+    schema_path = os.path.join(dataset_path, SCHEMA_FILE)
+    if not os.path.exists(schema_path) or \
+            os.path.getmtime(schema_path) < os.path.getmtime(path):
+        if dataset_path not in conversions:
+            print('Converting %s to %s' % (path, dataset_path))
+            if os.path.exists(schema_path):
+                os.remove(schema_path)
+        convert_csv_in_thread(path, dataset_path)
+    return MappedDataset(dataset_path)
+
+def dataset_name(path):
+    return os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
@@ -4,6 +4,12 @@ from sakura.daemon.processing.tab import Tab
 from sakura.daemon.processing.tools import Registry
 
 class Operator(Registry):
+    # 'local' or 'process' (compute output streams in the
+    # process pool, see pool.py)
+    EXEC_MODE = 'local'
+    # True if the output may be computed on partitions of the input
+    # rows (see partition.py)
+    PARTITION_SAFE = False
     def __init__(self, op_id):
         self.op_id = op_id
         self.input_streams = []
@@ -11,14 +17,24 @@ class Operator(Registry):
         self.internal_streams = []
         self.parameters = []
         self.tabs = []
+        # incremented when the results of the operator change for
+        # another reason than its parameters and inputs (see
+        # get_state() below)
+        self.version = 0
     def register_input(self, input_stream_label):
-        return self.register(self.input_streams, InputStream, input_stream_label)
-    def register_output(self, output_stream_label, compute_cb):
-        return self.register(self.output_streams, OutputStream, self, output_stream_label, compute_cb)
-    def register_internal_stream(self, internal_stream_label, compute_cb):
-        return self.register(self.internal_streams, InternalStream, self, internal_stream_label, compute_cb)
+        return self.register(self.input_streams, InputStream, self, input_stream_label)
+    def register_output(self, output_stream_label, compute_cb, compute_range_cb = None,
+                        compute_query_cb = None):
+        return self.register(self.output_streams, OutputStream, self, output_stream_label,
+                                compute_cb, compute_range_cb, compute_query_cb)
+    def register_internal_stream(self, internal_stream_label, compute_cb, compute_range_cb = None,
+                        compute_query_cb = None):
+        return self.register(self.internal_streams, InternalStream, self, internal_stream_label,
+                                compute_cb, compute_range_cb, compute_query_cb)
     def register_parameter(self, param_label, cls):
-        return self.register(self.parameters, cls, param_label)
+        param = self.register(self.parameters, cls, param_label)
+        param.operator = self
+        return param
     def register_tab(self, tab_label, js_path):
         return self.register(self.tabs, Tab, tab_label, js_path)
     def is_ready(self):
@@ -50,6 +66,35 @@ class Operator(Registry):
     def auto_fill_parameters(self):
         for param in self.parameters:
             param.auto_fill()
+    # called when an input stream is connected or disconnected
+    def refresh_parameters(self):
+        for param in self.parameters:
+            param.refresh()
+    # returns True if the value actually changed (if not, the
+    # results of this operator and the ones downstream are still
+    # valid).
+    def set_parameter_value(self, param_id, value):
+        param = self.parameters[param_id]
+        if param.selected() and param.get_value_serializable() == value:
+            return False
+        param.set_value(value)
+        return True
+    # the results of the operator only depend on its parameter values,
+    # the state of the streams connected to its inputs, and its version.
+    def get_state(self):
+        params = tuple(param.get_value_serializable() if param.selected() else None \
+                        for param in self.parameters)
+        inputs = tuple(stream.source_stream.get_state() if stream.connected() else None \
+                        for stream in self.input_streams)
+        return (self.version, repr(params), inputs)
+    # called when a parameter or an input stream changed
+    def invalidate(self):
+        for stream in self.output_streams + self.internal_streams:
+            stream.invalidate()
+    # called when the operator is deleted
+    def release(self):
+        for stream in self.output_streams + self.internal_streams:
+            stream.release()
 
 class InternalOperator(Operator):
     def __init__(self):
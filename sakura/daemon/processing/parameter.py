@@ -9,6 +9,7 @@ class Parameter(object):
         self.gui_type = gui_type
         self.label = label
         self.value = None
+        self.operator = None    # set by Operator.register_parameter()
 
     def selected(self):
         return self.value != None
@@ -50,11 +51,23 @@ class Parameter(object):
     # override in subclass if needed.
     def set_value(self, value):
         self.value = value
+        self.notify_change()
+
+    # subclasses overriding set_value() should call this.
+    def notify_change(self):
+        if self.operator != None:
+            self.operator.invalidate()
 
     # override in subclass if needed.
     def get_value_serializable(self):
         return self.value
 
+    # called when an input stream of the operator is connected or
+    # disconnected.
+    # override in subclass if needed.
+    def refresh(self):
+        pass
+
 class ComboParameter(Parameter):
     def __init__(self, label):
         super().__init__('COMBO', label)
@@ -99,8 +112,17 @@ class ColumnSelectionParameter(ComboParameter):
         self.raw_value = idx
         # value is the selected column
         self.value = tuple(self.matching_columns())[idx]
+        self.notify_change()
     def get_value_serializable(self):
         return self.raw_value
+    # the selected column belongs to the stream previously connected:
+    # select the column at the same index in the new stream, if any.
+    def refresh(self):
+        self.value = None
+        if self.raw_value != None and self.stream.connected():
+            columns = tuple(self.matching_columns())
+            if self.raw_value < len(columns):
+                self.value = columns[self.raw_value]
 
 def TypeBasedColumnSelection(stream, cls):
     class CustomParameterClass(ColumnSelectionParameter):
@@ -0,0 +1,178 @@
+import gevent
+from gevent.queue import Queue
+from sakura.daemon.processing.chunk import DEFAULT_CHUNK_SIZE
+from sakura.daemon.processing.pool import process_pool, build_operator, \
+            send_items, ProxyStream, get_param_values, get_stream_desc, \
+            get_stream_ref
+
+# Partitioned execution of a chain of operators.
+#
+# Operators declare with the PARTITION_SAFE class attribute that
+# their output can be computed on consecutive ranges of input rows,
+# either by concatenating the outputs computed on each range (e.g. a
+# row-wise transform), or, for aggregate operators (which implement
+# compute_partial(), see aggregate.py), by merging the partial results.
+#
+# When the output of a partition-safe operator is computed, the planner
+# walks upstream through partition-safe operators with a single input,
+# until it reaches a source stream with a known length and a
+# compute_range_cb(). If this source is large enough, its rows are split
+# into partitions, and the chain of operators is run on each partition
+# concurrently, in the process pool. The rows of each partition are
+# read by the daemon (compute_range_cb()) and streamed to the worker.
+
+MIN_PARTITION_ROWS = 100000
+# when outputs are concatenated, a partition may get ahead of the
+# ones before it by this number of messages (see pool.py); then
+# its worker waits.
+PARTITION_BUFFER = 64
+
+# rows [row_start, row_end[ of a stream.
+# full iterations read the partition with a single call to
+# compute_range_cb(), thus chunks output by the source (e.g. slices
+# of a memory-mapped dataset) are forwarded as is.
+class PartitionStream(object):
+    def __init__(self, stream, row_start, row_end):
+        self.stream = stream
+        self.row_start = row_start
+        self.length = row_end - row_start
+    def get_range(self, row_start, row_end):
+        row_end = min(row_end, self.length)
+        if row_end <= row_start:
+            return []
+        return self.stream.get_range(self.row_start + row_start, self.row_start + row_end)
+    def items(self, query = None):
+        items = self.stream.compute_range_cb(self.row_start, self.row_start + self.length)
+        if query != None:
+            items = query.apply(items)
+        return items
+    def rows(self, query = None):
+        return self.stream.iter_rows(self.items(query))
+    def __iter__(self):
+        return self.rows()
+    def chunks(self, chunk_size = DEFAULT_CHUNK_SIZE, query = None):
+        columns = self.stream.columns if query == None else query.project(self.stream.columns)
+        return self.stream.iter_chunks(self.items(query), chunk_size, columns)
+
+# worker side: chain is a list of (op_cls, op_id, param_values, stream_ref)
+# from upstream to downstream. stream_ref designates the stream of the
+# operator which feeds the next one or, for the last one, the stream
+# to compute.
+def run_partition_job(conn, source_desc, chain, merge):
+    stream = ProxyStream(conn, 0, *source_desc)
+    for op_cls, op_id, param_values, (stream_kind, stream_idx) in chain:
+        op = build_operator(op_cls, op_id, [stream], param_values)
+        stream = getattr(op, stream_kind)[stream_idx]
+    if merge:
+        conn.send(('state', op.compute_partial()))
+    else:
+        send_items(conn, stream.compute_cb())
+
+class PartitionPlan(object):
+    def __init__(self, source, chain, length, num_partitions):
+        self.source = source    # source stream
+        self.chain = chain      # [ (operator, stream), ... ]
+        self.length = length    # number of rows of the source
+        self.num_partitions = num_partitions    # (at most)
+    # bounds of num_partitions partitions: [ (row_start, row_end), ... ]
+    def get_bounds(self, num_partitions):
+        return [ (self.length * i // num_partitions,
+                  self.length * (i + 1) // num_partitions) \
+                        for i in range(num_partitions) ]
+
+class PartitionPlanner(object):
+    def __init__(self):
+        self.max_partitions = None
+    def configure(self, max_partitions):
+        self.max_partitions = max_partitions
+    def get_max_partitions(self):
+        if self.max_partitions == None:
+            return process_pool.get_size()
+        return self.max_partitions
+    # returns a PartitionPlan for the computation of this stream,
+    # or None if it should not be partitioned.
+    def plan(self, stream):
+        op = stream.operator
+        if not op.PARTITION_SAFE or not process_pool.available():
+            return None
+        chain = [ (op, stream) ]
+        while True:
+            if len(op.input_streams) != 1 or not op.input_streams[0].connected():
+                return None
+            source = op.input_streams[0].source_stream
+            op = source.operator
+            if not op.PARTITION_SAFE or hasattr(op, 'compute_partial'):
+                break
+            chain.insert(0, (op, source))
+        length = source.get_length()
+        if source.compute_range_cb == None or length == None:
+            return None
+        num_partitions = min(self.get_max_partitions(),
+                             process_pool.num_available(),
+                             length // MIN_PARTITION_ROWS)
+        if num_partitions < 2:
+            return None
+        return PartitionPlan(source, chain, length, num_partitions)
+    def run_partition(self, queue, worker, plan, row_start, row_end, merge):
+        columns, length = get_stream_desc(plan.source)
+        chain = [ (type(op), op.op_id, get_param_values(op), get_stream_ref(stream)) \
+                    for op, stream in plan.chain ]
+        part = PartitionStream(plan.source, row_start, row_end)
+        try:
+            for msg in process_pool.run_job(worker, run_partition_job,
+                        ((columns, part.length), chain, merge),
+                        [ part ], plan.chain[-1][0].NAME):
+                queue.put(msg)
+        except Exception as e:
+            queue.put(('error', e))
+        else:
+            queue.put(('end', None))
+    # replacement of stream.compute_cb() when a plan was found
+    def run(self, plan):
+        op, stream = plan.chain[-1]
+        merge = hasattr(op, 'compute_partial')
+        # workers are acquired now (we never wait for a worker, see
+        # pool.py): other computations may have taken some of them
+        # since the plan was made.
+        workers = []
+        for i in range(plan.num_partitions):
+            worker = process_pool.acquire()
+            if worker == None:
+                break
+            workers.append(worker)
+        if len(workers) < 2:
+            for worker in workers:
+                process_pool.release(worker)
+            yield from stream.run_compute_cb(partitioned = False)
+            return
+        queues, greenlets = [], []
+        for worker, (row_start, row_end) in zip(workers, plan.get_bounds(len(workers))):
+            queue = Queue(PARTITION_BUFFER)
+            queues.append(queue)
+            greenlets.append(gevent.spawn(self.run_partition,
+                        queue, worker, plan, row_start, row_end, merge))
+        try:
+            if merge:
+                partials = [ self.results(queue) for queue in queues ]
+                result = partials[0]
+                for partial in partials[1:]:
+                    result.merge(partial)
+                yield from result.rows()
+            else:
+                # outputs of the partitions, in order
+                for queue in queues:
+                    while True:
+                        items = self.results(queue)
+                        if items == None:
+                            break
+                        yield from items
+        finally:
+            gevent.killall(greenlets)
+    def results(self, queue):
+        kind, payload = queue.get()
+        if kind == 'error':
+            raise payload
+        return payload
+
+# per-daemon instance
+partition_planner = PartitionPlanner()
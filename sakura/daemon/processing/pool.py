@@ -0,0 +1,296 @@
+import os, sys, itertools, traceback, multiprocessing
+from gevent.queue import Queue
+from gevent.socket import wait_read
+from sakura.daemon.processing.chunk import Chunk
+from sakura.daemon.processing.cache import stream_cache
+
+# Operators with EXEC_MODE = 'process' (class attribute, or instance
+# attribute to select this mode for a given instance) compute their
+# output streams in a pool of worker processes. Thus a CPU-heavy
+# computation does not block the daemon, and several ones may run
+# on different cores.
+#
+# The worker rebuilds the operator from its class, its parameter
+# values and the description of its inputs: its input streams are
+# connected to proxies (see ProxyStream) which pull data from the
+# daemon process.
+# The operator state must therefore only depend on construct() and
+# on its parameters.
+#
+# A computation never waits for a worker: if all workers are busy,
+# the stream is computed in the daemon process. Waiting could
+# deadlock: the job of an operator holds its worker while it reads
+# its input streams, and computing these streams may need other
+# workers (e.g. a chain of operators running in the pool, longer
+# than the pool size).
+#
+# Messages exchanged over the pipe between the daemon and a worker:
+# daemon -> worker: ('run', func, args)      run func(conn, *args) (a job)
+#                   ('reply', result)         answer to 'next' or 'range'
+# worker -> daemon: ('items', items)          items of the computed stream
+#                   ('state', state)          partial state of an aggregate
+#                                             (see partition.py)
+#                   ('end',)                  end of the job
+#                   ('error', traceback)      the job failed
+#                   ('next', it_key, in_id, mode, args)
+#                                             next items of an input stream
+#                   ('close', it_key)         input iterator not needed anymore
+#                   ('range', in_id, args)    get_range() on an input stream
+
+ITEMS_PER_MESSAGE = 1000    # rows per message (chunks are sent one by one)
+PULL_ROWS = 1000            # rows per reply to a 'next' request
+WORKER_POLL_DELAY = 1.0     # workers exit if the daemon process is gone
+
+class WorkerError(Exception):
+    pass
+
+# worker side
+# ----------
+class ProxyStream(object):
+    def __init__(self, conn, in_id, columns, length):
+        # (imported here because stream.py imports this module)
+        from sakura.daemon.processing.stream import Column
+        self.conn = conn
+        self.in_id = in_id
+        self.columns = [ Column(col_label, col_type, self, col_index) \
+                        for col_index, (col_label, col_type) in enumerate(columns) ]
+        self.length = length
+        self.consumers = set()
+    def request(self, *msg):
+        self.conn.send(msg)
+        kind, result = self.conn.recv()
+        return result
+    def pull(self, mode, *args):
+        it_key = (self.in_id, next(it_keys))
+        ended = False
+        try:
+            while True:
+                items = self.request('next', it_key, self.in_id, mode, args)
+                if len(items) == 0:
+                    ended = True
+                    return
+                yield from items
+        finally:
+            if not ended:
+                self.conn.send(('close', it_key))
+    def __iter__(self):
+        return self.pull('rows')
+    def rows(self, *args):
+        return self.pull('rows', *args)
+    def chunks(self, *args):
+        return self.pull('chunks', *args)
+    def get_range(self, *args):
+        return self.request('range', self.in_id, args)
+
+it_keys = itertools.count()
+
+# sources: for each input stream, the stream it should be
+# connected to (or None)
+def build_operator(op_cls, op_id, sources, param_values):
+    op = op_cls(op_id)
+    op.construct()
+    for input_stream, source in zip(op.input_streams, sources):
+        if source != None:
+            input_stream.connect(source)
+    for param, value in zip(op.parameters, param_values):
+        if value != None:
+            param.set_value(value)
+    return op
+
+def send_items(conn, items):
+    rows = []
+    for item in items:
+        if isinstance(item, Chunk):
+            if len(rows) > 0:
+                conn.send(('items', rows))
+                rows = []
+            conn.send(('items', [item]))
+        else:
+            rows.append(item)
+            if len(rows) == ITEMS_PER_MESSAGE:
+                conn.send(('items', rows))
+                rows = []
+    if len(rows) > 0:
+        conn.send(('items', rows))
+
+def run_operator_job(conn, op_cls, op_id, inputs, param_values, stream_kind, stream_idx):
+    sources = [ None if input_desc == None else ProxyStream(conn, in_id, *input_desc) \
+                for in_id, input_desc in enumerate(inputs) ]
+    op = build_operator(op_cls, op_id, sources, param_values)
+    stream = getattr(op, stream_kind)[stream_idx]
+    send_items(conn, stream.compute_cb())
+
+def worker_main(conn, parent_conn, operators_dir):
+    parent_conn.close()
+    parent_pid = os.getppid()
+    # operators are computed right here, in this process
+    process_pool.in_worker = True
+    stream_cache.configure(0)
+    # operator modules are imported relative to operators_dir
+    # (see loading.py)
+    if operators_dir != None:
+        sys.path.insert(0, operators_dir)
+    while True:
+        try:
+            while not conn.poll(WORKER_POLL_DELAY):
+                if os.getppid() != parent_pid:
+                    return
+            msg = conn.recv()
+        except (EOFError, OSError):
+            return
+        func, args = msg[1:]
+        try:
+            func(conn, *args)
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+        else:
+            conn.send(('end',))
+
+# daemon side
+# -----------
+class Worker(object):
+    def __init__(self, operators_dir):
+        ctx = multiprocessing.get_context('fork')
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target = worker_main,
+                            args = (child_conn, self.conn, operators_dir))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+    def send(self, msg):
+        self.conn.send(msg)
+    def recv(self):
+        # let other greenlets run while the worker is computing
+        wait_read(self.conn.fileno())
+        return self.conn.recv()
+    def kill(self):
+        self.conn.close()
+        self.process.terminate()
+
+def pull_items(it):
+    items, num_rows = [], 0
+    for item in it:
+        items.append(item)
+        num_rows += len(item) if isinstance(item, Chunk) else 1
+        if num_rows >= PULL_ROWS:
+            break
+    return items
+
+def get_param_values(op):
+    return [ param.get_value_serializable() if param.selected() else None \
+             for param in op.parameters ]
+
+def get_stream_desc(stream):
+    return [ (col.label, col.type) for col in stream.columns ], stream.get_length()
+
+def get_stream_ref(stream):
+    op = stream.operator
+    if stream in op.output_streams:
+        return 'output_streams', op.output_streams.index(stream)
+    else:
+        return 'internal_streams', op.internal_streams.index(stream)
+
+def get_operator_job(stream):
+    op = stream.operator
+    inputs = [ get_stream_desc(input_stream.source_stream) \
+                    if input_stream.connected() else None \
+               for input_stream in op.input_streams ]
+    return (type(op), op.op_id, inputs, get_param_values(op)) + get_stream_ref(stream)
+
+class ProcessPool(object):
+    def __init__(self, size = None):
+        self.size = size
+        self.num_workers = 0
+        self.idle_workers = Queue()
+        self.operators_dir = None
+        self.in_worker = False
+    def configure(self, size, operators_dir = None):
+        self.size = size
+        self.operators_dir = operators_dir
+    def available(self):
+        return not self.in_worker
+    # number of workers we may get without waiting
+    def num_available(self):
+        return self.idle_workers.qsize() + self.get_size() - self.num_workers
+    def get_size(self):
+        if self.size == None:
+            return os.cpu_count()
+        return self.size
+    # returns None if no worker is available now (see above)
+    def acquire(self):
+        if not self.idle_workers.empty():
+            return self.idle_workers.get_nowait()
+        if self.num_workers < self.get_size():
+            self.num_workers += 1
+            try:
+                return Worker(self.operators_dir)
+            except BaseException:
+                self.num_workers -= 1
+                raise
+        return None
+    def release(self, worker):
+        self.idle_workers.put(worker)
+    def discard(self, worker):
+        # the worker may be computing something we do not need
+        # anymore: it is simpler to kill it.
+        worker.kill()
+        self.num_workers -= 1
+    # run func(conn, *args) in a worker (obtained with acquire()), and
+    # iterate over the messages it sends ('items' or 'state').
+    # input_streams are the streams the worker may read (through
+    # ProxyStream objects): its requests are served here.
+    def run_job(self, worker, func, args, input_streams, desc):
+        iterators = {}
+        done = False
+        try:
+            worker.send(('run', func, args))
+            while True:
+                msg = worker.recv()
+                kind = msg[0]
+                if kind in ('items', 'state'):
+                    yield msg
+                elif kind == 'next':
+                    it_key, in_id, mode, args = msg[1:]
+                    it = iterators.get(it_key)
+                    if it == None:
+                        input_stream = input_streams[in_id]
+                        if mode == 'rows':
+                            it = input_stream.rows(*args)
+                        else:
+                            it = input_stream.chunks(*args)
+                        iterators[it_key] = it
+                    items = pull_items(it)
+                    if len(items) == 0:
+                        del iterators[it_key]
+                    worker.send(('reply', items))
+                elif kind == 'close':
+                    iterators.pop(msg[1], None)
+                elif kind == 'range':
+                    in_id, args = msg[1:]
+                    worker.send(('reply', input_streams[in_id].get_range(*args)))
+                elif kind == 'end':
+                    done = True
+                    return
+                elif kind == 'error':
+                    done = True
+                    raise WorkerError('%s failed in worker process:\n%s' % \
+                                            (desc, msg[1]))
+        finally:
+            if done:
+                self.release(worker)
+            else:
+                self.discard(worker)
+    # replacement of stream.compute_cb() for operators running
+    # in the pool
+    def run(self, stream):
+        op = stream.operator
+        worker = self.acquire()
+        if worker == None:
+            yield from stream.compute_cb()
+            return
+        for kind, items in self.run_job(worker, run_operator_job,
+                        get_operator_job(stream), op.input_streams, op.NAME):
+            yield from items
+
+# per-daemon instance
+process_pool = ProcessPool()
@@ -0,0 +1,100 @@
+import operator
+import numpy as np
+from sakura.daemon.processing.chunk import Chunk
+
+# Queries allow a consumer of a stream to declare the columns it needs
+# and simple conditions on column values (predicates):
+# - columns: tuple of column indexes (None means all columns).
+#   The items obtained have these columns only, in this order.
+# - predicates: tuple of (col_index, op, value), where op is one
+#   of the keys of PREDICATE_OPERATORS. Only rows matching all
+#   predicates are obtained. Column indexes refer to the columns
+#   of the stream (not to the projected columns).
+#
+# Operators may compute the result of a query themselves, by providing
+# a compute_query_cb(query) when registering an output stream (e.g. a
+# source which can read some columns only). Otherwise, the query is
+# applied to the output of compute_cb() (see OutputStream.rows() and
+# OutputStream.chunks()).
+# However, if the whole stream is cached or being scanned, the query
+# is applied to these items instead of calling compute_query_cb():
+# computing the whole stream once is cheaper than computing it once,
+# then computing each query again (e.g. each column read by an
+# operator downstream). And concurrent iterations with the same query
+# share a single call to compute_query_cb() (see scan.py).
+# Queries are forwarded to remote daemons (see FragmentSourceOperator),
+# thus daemons only exchange the data which is actually needed.
+
+PREDICATE_OPERATORS = {
+    '=': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le,
+    '>': operator.gt, '>=': operator.ge
+}
+
+def compare(op, a, b):
+    try:
+        return bool(op(a, b))
+    except TypeError:
+        return False    # e.g. None compared to a number
+
+def compare_array(op, array, value):
+    if array.dtype.kind != 'O':
+        try:
+            mask = op(array, value)
+            if isinstance(mask, np.ndarray):
+                return mask
+        except TypeError:
+            pass    # (numpy cannot compare this dtype with value)
+    return np.fromiter((compare(op, a, value) for a in array), bool, len(array))
+
+class StreamQuery(object):
+    def __init__(self, columns = None, predicates = ()):
+        self.columns = None if columns == None else tuple(columns)
+        self.predicates = tuple((col_index, op, value) \
+                                for col_index, op, value in predicates)
+        for col_index, op, value in self.predicates:
+            if op not in PREDICATE_OPERATORS:
+                raise ValueError('Unknown predicate operator: %s' % op)
+    def get_serializable(self):
+        return self.columns, self.predicates
+    @staticmethod
+    def load(serialized):
+        if serialized == None:
+            return None
+        return StreamQuery(*serialized)
+    # columns of the result, given the columns of the stream
+    def project(self, columns):
+        if self.columns == None:
+            return columns
+        return [ columns[col_index] for col_index in self.columns ]
+    def matches(self, row):
+        for col_index, op, value in self.predicates:
+            if not compare(PREDICATE_OPERATORS[op], row[col_index], value):
+                return False
+        return True
+    # note: only the arrays of the columns involved are read (this
+    # matters for memory-mapped arrays, see dataset.py).
+    def apply_chunk(self, chunk):
+        arrays = chunk.arrays
+        if self.columns != None:
+            arrays = [ arrays[col_index] for col_index in self.columns ]
+        if len(self.predicates) > 0:
+            mask = np.ones(len(chunk), bool)
+            for col_index, op, value in self.predicates:
+                mask &= compare_array(PREDICATE_OPERATORS[op],
+                                      chunk.arrays[col_index], value)
+            arrays = [ array[mask] for array in arrays ]
+        return Chunk(arrays)
+    def apply_row(self, row):
+        if self.columns == None:
+            return row
+        return tuple(row[col_index] for col_index in self.columns)
+    # apply the query to items (rows or chunks) of the stream
+    def apply(self, items):
+        for item in items:
+            if isinstance(item, Chunk):
+                chunk = self.apply_chunk(item)
+                if len(chunk) > 0:
+                    yield chunk
+            elif self.matches(item):
+                yield self.apply_row(item)
@@ -0,0 +1,228 @@
+import collections, itertools, gevent
+from gevent.event import Event
+from sakura.daemon.processing.chunk import Chunk
+from sakura.daemon.processing.cache import estimate_size
+
+# When several consumers iterate over the same output stream at the
+# same time (e.g. 2 columns of the same stream read in parallel by an
+# operator, or 2 downstream operators), we run the upstream computation
+# only once, and feed each consumer through its own bounded buffer.
+#
+# The consumer which needs an item while its buffer is empty pulls
+# the upstream iterator, and the items it gets are appended to the
+# buffers of all consumers.
+# Meanwhile, other consumers needing items wait until they get some
+# (or until the pull is done), thus they can still drain their buffer.
+# If the buffer of another consumer is full:
+# - if this consumer runs in another greenlet, we wait until it
+#   consumes some items (backpressure).
+# - if this greenlet is itself waiting for items of another consumer
+#   (e.g. 2 columns of the stream zipped), it will only drain this
+#   buffer after we deliver these items: we let the buffer exceed its
+#   size (by SCAN_PULL_SIZE items at most) instead of waiting.
+# - otherwise (it runs in the same greenlet, thus it cannot progress
+#   while we are waiting) we detach it: it will continue with the items
+#   still in its buffer, then restart a private iteration.
+#
+# Items output by the scan are also kept in a replay buffer, as long
+# as its size is below SCAN_REPLAY_MAX_SIZE: a new consumer joining
+# a running scan first reads the items it missed from this buffer,
+# then continues with the items pulled after it joined. Once the
+# replay buffer has overflowed, new consumers start another scan.
+# Items are recorded only if another consumer may join later, i.e.
+# if the stream is not connected to a single input stream (several
+# operators downstream, or remote daemons reading it through cursors).
+# Otherwise, the consumers (e.g. columns zipped by the operator
+# downstream) usually join before the first pull, which needs no
+# replay; a consumer joining later starts another scan.
+# The replay buffer is released when the last consumer leaves, or
+# when the stream is invalidated.
+#
+# A consumer whose greenlet is dead is parked (e.g. in a checkpoint
+# of a stream downstream, see tools.py): it may resume much later,
+# or never. Parked consumers do not keep a scan joinable: when only
+# parked consumers remain, the replay buffer is released and new
+# consumers start another scan. If another consumer pulls items while
+# the buffer of a parked consumer is full, the parked consumer is
+# detached (see above).
+
+SCAN_BUFFER_SIZE = 64   # max number of items (rows or chunks) per buffer
+SCAN_PULL_SIZE = 16     # number of items pulled at once
+SCAN_REPLAY_MAX_SIZE = 32000000     # bytes
+
+class ReplayBuffer(object):
+    def __init__(self):
+        self.items = []
+        self.size = 0
+        self.row_size = None
+    # returns False if the buffer would become too large
+    def add(self, item):
+        if isinstance(item, Chunk):
+            self.size += item.nbytes
+        else:
+            # estimate the size of the 1st row only
+            if self.row_size == None:
+                self.row_size = estimate_size(item)
+            self.size += self.row_size
+        if self.size > SCAN_REPLAY_MAX_SIZE:
+            return False
+        self.items.append(item)
+        return True
+
+class ScanConsumer(object):
+    def __init__(self, scan):
+        self.scan = scan
+        # items output before we joined (the list may grow later,
+        # but we only read the items it holds now)
+        self.replay = scan.replay.items
+        self.replay_end = len(self.replay)
+        self.buffer = collections.deque()
+        self.position = 0   # number of items consumed
+        self.greenlet = None
+        self.drained = Event()
+        self.detached = False
+    def parked(self):
+        return self.greenlet != None and self.greenlet.dead
+    def full(self):
+        return len(self.buffer) >= SCAN_BUFFER_SIZE
+    def can_wait(self):
+        # we can wait for this consumer only if it runs in
+        # another greenlet which is still alive.
+        return  self.greenlet != None and \
+                self.greenlet != gevent.getcurrent() and \
+                not self.greenlet.dead
+    def __iter__(self):
+        self.greenlet = gevent.getcurrent()
+        try:
+            while self.position < self.replay_end:
+                item = self.replay[self.position]
+                self.position += 1
+                yield item
+                self.greenlet = gevent.getcurrent()
+            self.replay = None
+            while True:
+                if len(self.buffer) == 0:
+                    if self.detached:
+                        break
+                    if not self.scan.pull(self):
+                        return  # end of stream
+                    continue
+                item = self.buffer.popleft()
+                self.position += 1
+                self.drained.set()
+                yield item
+                # (we may be resumed by another greenlet, see parked())
+                self.greenlet = gevent.getcurrent()
+        finally:
+            self.scan.unregister(self)
+        # detached: restart a private iteration from our position
+        items = self.scan.compute_items()
+        yield from itertools.islice(items, self.position, None)
+
+# compute_items: function returning the items to be shared
+# (default: the items of the stream).
+class SharedScan(object):
+    def __init__(self, stream, compute_items = None):
+        self.stream = stream
+        self.compute_items = stream.compute_items \
+                if compute_items == None else compute_items
+        self.it = None
+        self.consumers = []
+        self.replay = ReplayBuffer()    # items kept for consumers joining late
+        self.recording = len(stream.consumers) != 1
+        self.pulling = False    # a consumer is pulling the upstream iterator
+        self.waiting = set()    # greenlets waiting in pull()
+        self.progress = Event() # set when items are pulled (see notify())
+        self.ended = False
+        self.error = None
+    def joinable(self):
+        self.release_parked()
+        return self.replay != None and self.error == None
+    def register(self):
+        consumer = ScanConsumer(self)
+        self.consumers.append(consumer)
+        return consumer
+    def unregister(self, consumer):
+        if consumer in self.consumers:
+            self.consumers.remove(consumer)
+        if len(self.consumers) == 0:
+            self.close()
+        else:
+            self.release_parked()
+    def release_parked(self):
+        if len(self.consumers) > 0 and \
+                all(c.parked() for c in self.consumers):
+            self.replay = None  # nobody can join now
+    # the stream was invalidated: the items are obsolete
+    def invalidate(self):
+        self.replay = None  # nobody can join now
+    def close(self):
+        self.replay = None  # nobody can join now
+        if self.it != None:
+            self.it.close()
+            self.it = None
+    def wait_room(self, consumer):
+        while consumer.full() and not consumer.detached:
+            if consumer.greenlet in self.waiting:
+                return  # it will drain its buffer after this pull
+            if consumer.can_wait():
+                consumer.drained.clear()
+                consumer.drained.wait()
+            else:
+                consumer.detached = True
+                self.consumers.remove(consumer)
+    def wait_progress(self):
+        current = gevent.getcurrent()
+        self.waiting.add(current)
+        # the puller may be waiting for another consumer of this
+        # greenlet to drain its buffer (see wait_room()): wake it up.
+        for c in self.consumers:
+            if c.greenlet is current:
+                c.drained.set()
+        try:
+            self.progress.wait()
+        finally:
+            self.waiting.discard(current)
+    # wake up consumers waiting in pull()
+    def notify(self):
+        progress, self.progress = self.progress, Event()
+        progress.set()
+    def pull(self, consumer):
+        # returns False at the end of the stream
+        while self.pulling:
+            if len(consumer.buffer) > 0:
+                return True     # another consumer is pulling for us
+            self.wait_progress()
+        if len(consumer.buffer) > 0:
+            return True
+        if self.error != None:
+            raise self.error
+        if self.ended:
+            return False
+        self.pulling = True
+        try:
+            if self.it == None:
+                self.it = self.compute_items()
+            for i in range(SCAN_PULL_SIZE):
+                for other in tuple(self.consumers):
+                    if other is not consumer:
+                        self.wait_room(other)
+                try:
+                    item = next(self.it)
+                except StopIteration:
+                    self.ended = True
+                    break
+                except BaseException as e:
+                    # let other consumers know
+                    self.error = e
+                    raise
+                for c in self.consumers:
+                    c.buffer.append(item)
+                if self.replay != None and \
+                        (not self.recording or not self.replay.add(item)):
+                    self.replay = None
+                self.notify()
+            return len(consumer.buffer) > 0
+        finally:
+            self.pulling = False
+            self.notify()
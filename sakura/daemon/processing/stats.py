@@ -0,0 +1,122 @@
+import numpy as np
+from sakura.daemon.processing.chunk import Chunk, column_array
+
+# Statistics about the rows of a stream: number of rows and, for each
+# column, min and max values, number of null values (None or NaN)
+# and an estimate of the number of distinct values.
+# They are computed as a by-product of a complete iteration over the
+# stream (see OutputStream.compute_items()), thus they are only
+# available after a first scan.
+#
+# The number of distinct values is estimated with a KMV sketch: we keep
+# the DISTINCT_SKETCH_SIZE smallest hash values of the column values;
+# if hash values are uniformly distributed, the k-th smallest one
+# tells how dense they are.
+
+DISTINCT_SKETCH_SIZE = 256
+ROWS_BATCH = 4096   # rows are processed in batches of this size
+
+M1 = np.uint64(0xbf58476d1ce4e5b9)
+M2 = np.uint64(0x94d049bb133111eb)
+HASH_RANGE = float(1 << 64)
+
+def hash_values(array):
+    if array.dtype.kind in 'iub':
+        h = array.astype(np.int64).view(np.uint64)
+    elif array.dtype.kind == 'f':
+        h = array.astype(np.float64).view(np.uint64)
+    else:
+        h = np.fromiter((hash(val) for val in array), np.int64, len(array)).view(np.uint64)
+    # mix bits (finalizer of splitmix64)
+    h = h ^ (h >> np.uint64(30))
+    h = h * M1
+    h = h ^ (h >> np.uint64(27))
+    h = h * M2
+    return h ^ (h >> np.uint64(31))
+
+def to_python(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+class ColumnStats(object):
+    def __init__(self):
+        self.min = None
+        self.max = None
+        self.nulls = 0
+        self.sketch = np.empty(0, np.uint64)
+    def update_range(self, vmin, vmax):
+        if self.min == None:
+            self.min, self.max = vmin, vmax
+        else:
+            self.min, self.max = min(self.min, vmin), max(self.max, vmax)
+    def update(self, array):
+        if array.dtype.kind == 'f':
+            nulls = np.isnan(array)
+            array = array[~nulls]
+        elif array.dtype.kind == 'O':
+            nulls = np.fromiter((val is None for val in array), bool, len(array))
+            array = array[~nulls]
+        else:
+            nulls = ()
+        self.nulls += int(np.count_nonzero(nulls))
+        if len(array) == 0:
+            return
+        if array.dtype.kind in 'OUS':
+            try:
+                self.update_range(to_python(min(array)), to_python(max(array)))
+            except TypeError:
+                pass    # values cannot be compared
+        else:
+            self.update_range(to_python(array.min()), to_python(array.max()))
+        try:
+            hashes = hash_values(array)
+        except TypeError:
+            return      # values cannot be hashed
+        sketch = np.unique(np.concatenate((self.sketch, hashes)))
+        self.sketch = sketch[:DISTINCT_SKETCH_SIZE]
+    def distinct(self):
+        if len(self.sketch) < DISTINCT_SKETCH_SIZE:
+            return len(self.sketch)     # exact
+        return int((DISTINCT_SKETCH_SIZE - 1) * HASH_RANGE / float(self.sketch[-1]))
+    def get_serializable(self):
+        return dict(min = self.min, max = self.max,
+                    nulls = self.nulls, distinct = self.distinct())
+
+class StreamStats(object):
+    def __init__(self, columns):
+        self.columns = columns
+        self.rows = 0
+        self.column_stats = [ ColumnStats() for col in columns ]
+        self.pending_rows = []
+    def update_arrays(self, arrays):
+        for col_stats, array in zip(self.column_stats, arrays):
+            col_stats.update(array)
+    def flush_rows(self):
+        rows, self.pending_rows = self.pending_rows, []
+        if len(rows) == 0:
+            return
+        arrays = []
+        for values, col in zip(zip(*rows), self.columns):
+            if col.dtype is not object:
+                try:
+                    arrays.append(column_array(values, col.dtype))
+                    continue
+                except (TypeError, ValueError):
+                    pass    # e.g. str values in an int column
+            arrays.append(np.fromiter(values, object, len(values)))
+        self.update_arrays(arrays)
+    def add(self, item):
+        if isinstance(item, Chunk):
+            self.flush_rows()
+            self.rows += len(item)
+            self.update_arrays(item.arrays)
+        else:
+            self.rows += 1
+            self.pending_rows.append(item)
+            if len(self.pending_rows) == ROWS_BATCH:
+                self.flush_rows()
+    def done(self):
+        self.flush_rows()
+    def get_serializable(self):
+        return dict(rows = self.rows,
+                    columns = [ col_stats.get_serializable() \
+                                for col_stats in self.column_stats ])
@@ -1,28 +1,67 @@
-from sakura.daemon.processing.tools import Registry
+from sakura.daemon.processing.tools import Registry, CheckpointedIterator
+from sakura.daemon.processing.chunk import Chunk, numpy_type, DEFAULT_CHUNK_SIZE
+from sakura.daemon.processing.cache import stream_cache
+from sakura.daemon.processing.scan import SharedScan
+from sakura.daemon.processing.pool import process_pool
+from sakura.daemon.processing.partition import partition_planner
+from sakura.daemon.processing.stats import StreamStats
+from sakura.daemon.processing.query import StreamQuery
+
+# items are rows or chunks (see OutputStream below)
+def items_range(items, row_start, row_end):
+    rows = []
+    row_idx = 0
+    for item in items:
+        if row_idx >= row_end:
+            break
+        if isinstance(item, Chunk):
+            if row_idx + len(item) > row_start:
+                chunk = item[max(row_start - row_idx, 0):row_end - row_idx]
+                rows.extend(chunk.rows())
+            row_idx += len(item)
+        else:
+            if row_idx >= row_start:
+                rows.append(item)
+            row_idx += 1
+    return rows
 
 class Column(object):
     def __init__(self, col_label, col_type, output_stream, col_index):
         self.label = col_label
         self.type = col_type
+        self.dtype = numpy_type(col_type)
         self.output_stream = output_stream
         self.index = col_index
     def get_info_serializable(self):
         return (self.label, self.type.__name__)
+    # we only need this column (see query.py)
     def __iter__(self):
-        for row in self.output_stream:
-            yield row[self.index]
+        for row in self.output_stream.rows(StreamQuery((self.index,))):
+            yield row[0]
+    def chunks(self, chunk_size = DEFAULT_CHUNK_SIZE):
+        query = StreamQuery((self.index,))
+        for chunk in self.output_stream.chunks(chunk_size, query):
+            yield chunk.arrays[0]
 
 class InputStream(object):
-    def __init__(self, label):
+    def __init__(self, operator, label):
+        self.operator = operator
         self.source_stream = None
         self.columns = None
         self.label = label
     def connect(self, output_stream):
         self.source_stream = output_stream
         self.columns = self.source_stream.columns
+        output_stream.consumers.add(self)
+        self.operator.refresh_parameters()
+        self.operator.invalidate()
     def disconnect(self):
+        if self.connected():
+            self.source_stream.consumers.discard(self)
         self.source_stream = None
         self.columns = None
+        self.operator.refresh_parameters()
+        self.operator.invalidate()
     def connected(self):
         return self.source_stream != None
     def columns(self):
@@ -33,7 +72,7 @@ class InputStream(object):
             info.update(
                 connected = True,
                 columns = [ col.get_info_serializable() for col in self.columns ],
-                length = self.source_stream.length
+                length = self.source_stream.get_length()
             )
         else:
             info.update(
@@ -45,6 +84,16 @@ class InputStream(object):
             return self.source_stream.__iter__()
         else:
             return None
+    def rows(self, *args):
+        if self.connected():
+            return self.source_stream.rows(*args)
+        else:
+            return None
+    def chunks(self, *args):
+        if self.connected():
+            return self.source_stream.chunks(*args)
+        else:
+            return None
     def get_range(self, *args):
         if self.connected():
             return self.source_stream.get_range(*args)
@@ -52,31 +101,177 @@ class InputStream(object):
             return None
 
 class OutputStream(Registry):
-    def __init__(self, operator, label, compute_cb):
+    def __init__(self, operator, label, compute_cb, compute_range_cb = None,
+                 compute_query_cb = None):
         self.columns = []
         self.operator = operator
         self.label = label
         self.compute_cb = compute_cb
-        self.length = None
+        # optional: compute_range_cb(row_start, row_end) allows the
+        # operator to compute a range of rows without iterating
+        # over previous rows.
+        self.compute_range_cb = compute_range_cb
+        # optional: compute_query_cb(query) allows the operator to
+        # compute the result of a query (see query.py) by itself.
+        self.compute_query_cb = compute_query_cb
+        # note: checkpoints are long-lived iterators, they should not
+        # hold a shared scan (see below).
+        self.checkpoints = CheckpointedIterator(self.iter_private)
+        self.scan = None        # shared scan currently running
+        self.query_scans = {}   # query -> shared scan of compute_query_cb()
+        self.consumers = set()  # input streams connected to this stream
+        self.generation = 0     # incremented each time we are invalidated
+        self.state = None       # (generation, state), see get_state()
+        self.stats = None       # computed during the first complete scan
+        self.length = None      # may be declared by the operator
     def add_column(self, col_label, col_type):
         return self.register(self.columns, Column, col_label, col_type, self, len(self.columns))
+    # the items of the stream only depend on this state (see cache.py).
+    # it can only change when we are invalidated (a parameter or an
+    # input changed, here or upstream), thus it is computed once per
+    # generation.
+    def get_state(self):
+        if self.state == None or self.state[0] != self.generation:
+            self.state = (self.generation, (self, self.operator.get_state()))
+        return self.state[1]
+    def get_length(self):
+        if self.length == None and self.stats != None:
+            return self.stats.rows
+        return self.length
     def get_info_serializable(self):
         return dict(label = self.label,
                     columns = [ col.get_info_serializable() for col in self.columns ],
-                    length = self.length)
+                    length = self.get_length(),
+                    stats = None if self.stats == None else self.stats.get_serializable())
+    # output of compute_cb(), or its cached version.
+    # partitioned execution is only worth it for full scans, not for
+    # private iterations (which are parked in checkpoints).
+    def compute_items(self, partitioned = True):
+        items = stream_cache.get(self)
+        if items == None:
+            items = self.run_compute_cb(partitioned)
+            if stream_cache.enabled():
+                items = self.record_cache(items)
+        if self.stats == None:
+            items = self.record_stats(items)
+        yield from items
+    def record_cache(self, items):
+        recorder = stream_cache.recorder(self)
+        for item in items:
+            recorder.add(item)
+            yield item
+        recorder.done()
+    def record_stats(self, items):
+        generation = self.generation
+        stats = StreamStats(self.columns)
+        for item in items:
+            stats.add(item)
+            yield item
+        stats.done()
+        # (if the scan completed)
+        if self.generation == generation:
+            self.stats = stats
+    # compute_cb() runs in this process or in the process pool,
+    # depending on the operator (see pool.py), possibly on several
+    # partitions of the input (see partition.py).
+    def run_compute_cb(self, partitioned):
+        if partitioned:
+            plan = partition_planner.plan(self)
+            if plan != None:
+                return partition_planner.run(plan)
+        if self.operator.EXEC_MODE == 'process' and process_pool.available():
+            return process_pool.run(self)
+        return self.compute_cb()
+    # concurrent iterations share a single computation (see scan.py).
+    def shared_items(self):
+        if self.scan == None or not self.scan.joinable():
+            self.scan = SharedScan(self)
+        return self.scan.register()
+    def shared_query_items(self, query):
+        # (forget the scans which ended)
+        for key, scan in tuple(self.query_scans.items()):
+            if not scan.joinable():
+                del self.query_scans[key]
+        key = query.get_serializable()
+        if key not in self.query_scans:
+            self.query_scans[key] = SharedScan(self,
+                        lambda: self.compute_query_cb(query))
+        return self.query_scans[key].register()
+    # compute_cb() may yield rows (tuples) or chunks (see chunk.py).
+    # the following methods adapt this output as needed.
+    def iter_rows(self, items):
+        for item in items:
+            if isinstance(item, Chunk):
+                yield from item.rows()
+            else:
+                yield item
+    def iter_private(self):
+        return self.iter_rows(self.compute_items(partitioned = False))
+    # items restricted by a query (if any, see query.py): computed
+    # by compute_query_cb() if the operator provides it, filtered
+    # from the shared scan otherwise (or if the whole stream is
+    # being scanned or is cached anyway).
+    def query_items(self, query = None):
+        if query == None:
+            return self.shared_items()
+        if self.compute_query_cb != None:
+            full_scan = (self.scan != None and self.scan.joinable()) or \
+                        stream_cache.contains(self)
+            if not full_scan:
+                return self.shared_query_items(query)
+        return query.apply(self.shared_items())
+    def rows(self, query = None):
+        return self.iter_rows(self.query_items(query))
     def __iter__(self):
-        for row in self.compute_cb():
-            yield row
-    def get_range(self, row_start, row_end):
+        return self.rows()
+    # columns: columns of the items (default: all columns)
+    def iter_chunks(self, items, chunk_size = DEFAULT_CHUNK_SIZE, columns = None):
+        if columns == None:
+            columns = self.columns
         rows = []
-        row_idx = 0
-        for row in self:
-            if row_idx == row_end:
-                break
-            if row_start <= row_idx:
-                rows.append(row)
-            row_idx += 1
-        return rows
+        for item in items:
+            if isinstance(item, Chunk):
+                if len(rows) > 0:
+                    yield Chunk.from_rows(rows, columns)
+                    rows = []
+                yield item
+            else:
+                rows.append(item)
+                if len(rows) == chunk_size:
+                    yield Chunk.from_rows(rows, columns)
+                    rows = []
+        if len(rows) > 0:
+            yield Chunk.from_rows(rows, columns)
+    def chunks(self, chunk_size = DEFAULT_CHUNK_SIZE, query = None):
+        columns = self.columns if query == None else query.project(self.columns)
+        return self.iter_chunks(self.query_items(query), chunk_size, columns)
+    def get_range(self, row_start, row_end):
+        items = stream_cache.get(self)
+        if items != None:
+            return items_range(items, row_start, row_end)
+        if self.compute_range_cb != None:
+            return list(self.iter_rows(self.compute_range_cb(row_start, row_end)))
+        return self.checkpoints.get_range(row_start, row_end)
+    def invalidate(self):
+        # the rows we may have computed are obsolete, and so are
+        # the ones computed by operators downstream.
+        self.generation += 1
+        self.stats = None
+        self.checkpoints.reset()
+        if self.scan != None:
+            self.scan.invalidate()
+            self.scan = None
+        for scan in self.query_scans.values():
+            scan.invalidate()
+        self.query_scans = {}
+        # note: cached items are keyed by the state of the stream,
+        # thus we do not have to drop them (see cache.py).
+        for input_stream in tuple(self.consumers):
+            input_stream.operator.invalidate()
+    # the operator is being deleted
+    def release(self):
+        self.invalidate()
+        stream_cache.invalidate(self)
 
 # internal streams and output streams are the same
 # object.
@@ -1,4 +1,4 @@
-
+import collections, itertools
 
 class Registry(object):
     def register(self, container, cls, *args):
@@ -6,3 +6,55 @@ class Registry(object):
         container.append(obj)
         return obj
 
+# When reading a range of rows in a stream that cannot compute
+# a range natively, we have to iterate from row 0.
+# In order to avoid this as much as possible, this class keeps
+# a few partially consumed iterators (checkpoints), indexed
+# by the row position they reached. A range read resumes
+# from the nearest checkpoint before row_start, and the
+# iterator is saved again at row_end afterwards.
+# Thus, paging forward costs the size of the page only.
+# Exception: if the stream reads a shared scan of another stream
+# (see scan.py), the scan consumer parked in the checkpoint may be
+# detached while it is parked, if other consumers of this scan run
+# meanwhile. In this case, the next page restarts the iteration of
+# the other stream from row 0 (once: later pages resume from this
+# private iteration).
+class CheckpointedIterator(object):
+    def __init__(self, iter_cb, max_checkpoints = 4):
+        self.iter_cb = iter_cb
+        self.max_checkpoints = max_checkpoints
+        self.checkpoints = collections.OrderedDict()    # row_idx -> iterator
+    def pop_nearest(self, row_idx):
+        positions = tuple(pos for pos in self.checkpoints if pos <= row_idx)
+        if len(positions) == 0:
+            return 0, self.iter_cb()
+        pos = max(positions)
+        return pos, self.checkpoints.pop(pos)
+    def save(self, row_idx, it):
+        if row_idx in self.checkpoints:
+            self.close(self.checkpoints.pop(row_idx))
+        self.checkpoints[row_idx] = it
+        while len(self.checkpoints) > self.max_checkpoints:
+            # discard the least recently saved checkpoint
+            pos, old_it = self.checkpoints.popitem(last = False)
+            self.close(old_it)
+    def close(self, it):
+        # release resources held by generators
+        if hasattr(it, 'close'):
+            it.close()
+    def get_range(self, row_start, row_end):
+        pos, it = self.pop_nearest(row_start)
+        # skip rows up to row_start
+        next(itertools.islice(it, row_start - pos, row_start - pos), None)
+        rows = list(itertools.islice(it, row_end - row_start))
+        if len(rows) == row_end - row_start:
+            # the stream may have more rows, keep this iterator
+            self.save(row_end, it)
+        else:
+            self.close(it)
+        return rows
+    def reset(self):
+        for it in self.checkpoints.values():
+            self.close(it)
+        self.checkpoints = collections.OrderedDict()
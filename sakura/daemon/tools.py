@@ -1,4 +1,5 @@
 from gevent.socket import create_connection
+from sakura.common.codec import PROTOCOLS, PREFERRED_PROTOCOLS
 import sakura.daemon.conf as conf
 
 def connect_to_hub():
@@ -15,3 +16,11 @@ def set_daemon_id(sock_file, daemon_id):
     sock_file.write(b'SETID\n')
     sock_file.write(("%d\n" % daemon_id).encode("ascii"))
     sock_file.flush()
+
+# propose the protocols we support, the hub selects one.
+def negotiate_protocol(sock_file):
+    sock_file.write(b'PROTOCOL\n')
+    sock_file.write((' '.join(PREFERRED_PROTOCOLS) + '\n').encode("ascii"))
+    sock_file.flush()
+    name = sock_file.readline().strip().decode("ascii")
+    return PROTOCOLS[name]
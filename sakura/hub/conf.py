@@ -9,6 +9,12 @@ def load_conf():
                 help="Specify alternate configuration file",
                 type=argparse.FileType('r'),
                 default='/etc/sakura/hub.conf')
+    parser.add_argument('--gui-max-requests',
+                help="Max number of GUI requests handled concurrently (default: 64)",
+                type=int)
+    parser.add_argument('--gui-max-requests-per-client',
+                help="Max number of requests of a GUI client handled concurrently (default: 8)",
+                type=int)
     parser.add_argument('WEBAPP',
                 help="Specify web app sub-directory",
                 type=str,
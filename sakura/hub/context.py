@@ -1,7 +1,11 @@
+import collections
 from collections import namedtuple
 from sakura.hub.opclasses import OpClassRegistry
 from sakura.hub.opinstances import OpInstanceRegistry
 from sakura.hub.links import LinkRegistry
+from sakura.hub.pagecache import PageCache
+from sakura.common.io import gather
+from sakura.common.metrics import rpc_metrics
 
 class HubContext(object):
     def __init__(self):
@@ -10,14 +14,15 @@ class HubContext(object):
         self.op_classes = OpClassRegistry()
         self.op_instances = OpInstanceRegistry()
         self.links = LinkRegistry()
+        self.page_cache = PageCache()
     def get_daemon_id(self):
         daemon_id = self.next_daemon_id
         self.next_daemon_id += 1
         return daemon_id
-    def register_daemon(self, daemon_id, daemon_info, api):
+    def register_daemon(self, daemon_id, daemon_info, api, host):
         # register daemon info and operator classes.
         # note: we convert daemon_info dict to namedtuple (it will be more handy)
-        daemon_info.update(daemon_id = daemon_id, api = api)
+        daemon_info.update(daemon_id = daemon_id, api = api, host = host)
         daemon_info = namedtuple('DaemonInfo', daemon_info.keys())(**daemon_info)
         self.daemons[daemon_id] = daemon_info
         for op_cls_info in daemon_info.op_classes:
@@ -26,7 +31,15 @@ class HubContext(object):
         for daemon in self.daemons.values():
             d = dict(daemon._asdict())
             del d['api']
+            d.pop('data_token', None)   # (see daemons/manager.py)
             yield d
+    def get_metrics(self):
+        daemon_ids = tuple(self.daemons.keys())
+        daemon_metrics = gather(*(self.daemons[daemon_id].api.futures.get_metrics() \
+                                        for daemon_id in daemon_ids))
+        return dict(
+            hub = rpc_metrics.get_serializable(),
+            daemons = dict(zip(daemon_ids, daemon_metrics)))
     def register_op_class(self, *args):
         self.op_classes.store(*args)
     def list_op_classes_serializable(self):
@@ -38,6 +51,20 @@ class HubContext(object):
                     tags = info.tags,
                     svg = info.icon,
                 ) for info in self.op_classes.list() ]
+    def list_op_instances_info_serializable(self):
+        # group operators by daemon, and get info about the operators
+        # of each daemon with a single request.
+        # requests to the different daemons run concurrently.
+        op_ids_per_daemon = collections.defaultdict(list)
+        for op_id in self.op_instances.list_op_ids():
+            op_ids_per_daemon[self.op_instances[op_id].daemon.daemon_id].append(op_id)
+        async_results = []
+        for daemon_id, op_ids in op_ids_per_daemon.items():
+            batch = self.daemons[daemon_id].api.batch()
+            for op_id in op_ids:
+                batch.op_instances[op_id].get_info_serializable()
+            async_results.append(batch.run_async())
+        return sum(gather(*async_results), [])
     # instanciate an operator and return the instance id
     def create_operator_instance(self, cls_id):
         cls_info = self.op_classes.get_cls_info(cls_id)
@@ -52,9 +79,49 @@ class HubContext(object):
             self.delete_link(link_id)
         # second: delete the operator itself.
         self.op_instances.delete(op_id)
+        self.page_cache.invalidate((op_id,))
     def create_link(self, src_op_id, src_out_id, dst_op_id, dst_in_id):
         src_op = self.op_instances[src_op_id]
         dst_op = self.op_instances[dst_op_id]
-        return self.links.create(src_op, src_out_id, dst_op, dst_in_id)
+        link_id = self.links.create(src_op, src_out_id, dst_op, dst_in_id)
+        self.invalidate_downstream(dst_op_id)
+        return link_id
     def delete_link(self, link_id):
+        dst_op_id = self.links[link_id].dst_op.op_id
         self.links.delete(link_id)
+        self.invalidate_downstream(dst_op_id)
+    # kind: 'input_streams', 'output_streams' or 'internal_streams'
+    def get_stream_range(self, op_id, kind, stream_id, row_start, row_end):
+        return self.page_cache.get_range(self.op_instances[op_id],
+                            kind, stream_id, row_start, row_end)
+    def set_parameter_value(self, op_id, param_id, value):
+        # (nothing to invalidate if the value did not change)
+        if self.op_instances[op_id].set_parameter_value(param_id, value):
+            self.invalidate_downstream(op_id)
+    # results of operators downstream of op_id are obsolete.
+    # daemons invalidate their own operators, but the ones
+    # reached through a link to another daemon must be notified.
+    # pages cached by the hub are dropped afterwards, thus pages
+    # fetched while the daemons were being notified are dropped too.
+    def invalidate_downstream(self, op_id):
+        gather(*self.invalidate_downstream_async(op_id))
+        self.page_cache.invalidate(self.iter_downstream(op_id))
+    def iter_downstream(self, op_id):
+        yield op_id
+        for link_id in self.op_instances[op_id].attached_links:
+            link = self.links[link_id]
+            if link.src_op.op_id == op_id:
+                yield from self.iter_downstream(link.dst_op.op_id)
+    def invalidate_downstream_async(self, op_id):
+        op = self.op_instances[op_id]
+        async_results = []
+        for link_id in op.attached_links:
+            link = self.links[link_id]
+            if link.src_op.op_id != op_id:
+                continue
+            dst_op = link.dst_op
+            if dst_op.daemon.daemon_id != op.daemon.daemon_id:
+                async_results.append(dst_op.daemon.api.futures.invalidate_input(
+                                                dst_op.op_id, link.dst_in_id))
+            async_results.extend(self.invalidate_downstream_async(dst_op.op_id))
+        return async_results
@@ -3,3 +3,11 @@ class DaemonToHubAPI(object):
     def __init__(self, daemon_id, context):
         self.daemon_id = daemon_id
         self.context = context
+    # return the (host, port, token) allowing other daemons to reach
+    # the daemon running op_id directly, or None.
+    def get_peer_endpoint(self, op_id):
+        daemon = self.context.op_instances[op_id].daemon
+        data_port = getattr(daemon, 'data_port', None)
+        if data_port == None:
+            return None
+        return (daemon.host, data_port, daemon.data_token)
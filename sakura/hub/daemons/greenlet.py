@@ -3,6 +3,7 @@ from gevent.server import StreamServer
 from sakura.hub.daemons.manager import \
             rpc_client_manager, rpc_server_manager
 from sakura.hub.tools import monitored
+from sakura.common.codec import PROTOCOLS, select_protocol
 import sakura.hub.conf as conf
 from enum import Enum
 
@@ -13,6 +14,8 @@ def daemons_greenlet(context):
     def handle(socket, address):
         sock_file = socket.makefile(mode='rwb')
         mode, daemon_id = None, None
+        # default protocol, if the daemon does not negotiate
+        protocol_name = 'pickle'
         while True:
             req = sock_file.readline().strip()
             if req == b'GETID':
@@ -21,6 +24,11 @@ def daemons_greenlet(context):
                 sock_file.flush()
             elif req == b'SETID':
                 daemon_id = int(sock_file.readline().strip())
+            elif req == b'PROTOCOL':
+                proposed = sock_file.readline().strip().decode("ascii").split()
+                protocol_name = select_protocol(proposed)
+                sock_file.write((protocol_name + '\n').encode("ascii"))
+                sock_file.flush()
             elif req == b'RPC_SERVER':
                 # if the remote end says 'server', we are client :)
                 mode = GreenletModes.RPC_CLIENT
@@ -29,11 +37,12 @@ def daemons_greenlet(context):
                 # if the remote end says 'client', we are server :)
                 mode = GreenletModes.RPC_SERVER
                 break
-        print(mode, daemon_id)
+        print(mode, daemon_id, protocol_name)
+        protocol = PROTOCOLS[protocol_name]
         if mode == GreenletModes.RPC_CLIENT:
-            rpc_client_manager(daemon_id, context, sock_file)
+            rpc_client_manager(daemon_id, context, sock_file, protocol, address[0])
         if mode == GreenletModes.RPC_SERVER:
-            rpc_server_manager(daemon_id, context, sock_file)
+            rpc_server_manager(daemon_id, context, sock_file, protocol)
     server = StreamServer(('0.0.0.0', conf.hub_port), handle)
     server.start()
     # wait for end or exception
@@ -1,22 +1,25 @@
-import pickle
-import gevent.pool
+import secrets, gevent.pool
 from sakura.common.io import RemoteAPIForwarder, \
                                 LocalAPIHandler
 from sakura.hub.daemons.api import DaemonToHubAPI
 
-def rpc_client_manager(daemon_id, context, sock_file):
+def rpc_client_manager(daemon_id, context, sock_file, protocol, host):
     print('new rpc connection hub (client) -> daemon %d (server).' % daemon_id)
-    remote_api = RemoteAPIForwarder(sock_file, pickle)
+    remote_api = RemoteAPIForwarder(sock_file, protocol)
     daemon_info = remote_api.get_daemon_info_serializable()
-    context.register_daemon(daemon_id, daemon_info, remote_api)
+    if daemon_info.get('data_port') != None:
+        # token other daemons must send to its data port (see peers.py)
+        daemon_info['data_token'] = secrets.token_hex(16)
+        remote_api.set_data_token(daemon_info['data_token'])
+    context.register_daemon(daemon_id, daemon_info, remote_api, host)
     remote_api.loop()
     print('rpc connection hub (client) -> daemon %d (server) disconnected.' % daemon_id)
 
-def rpc_server_manager(daemon_id, context, sock_file):
+def rpc_server_manager(daemon_id, context, sock_file, protocol):
     print('new rpc connection hub (server) <- daemon %d (client).' % daemon_id)
     pool = gevent.pool.Group()
     local_api = DaemonToHubAPI(daemon_id, context)
-    handler = LocalAPIHandler(sock_file, pickle, local_api, pool)
+    handler = LocalAPIHandler(sock_file, protocol, local_api, pool)
     handler.loop()
     print('rpc connection hub (server) <- daemon %d (client) disconnected.' % daemon_id)
 
@@ -26,3 +26,5 @@ class OpInstanceRegistry(object):
         del self.info_per_op_id[op_id]
     def __getitem__(self, op_id):
         return self.info_per_op_id[op_id]
+    def list_op_ids(self):
+        return self.info_per_op_id.keys()
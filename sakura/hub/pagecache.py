@@ -0,0 +1,90 @@
+import collections, gevent
+from gevent.event import AsyncResult
+
+# Cache of stream rows requested by the GUI.
+# Ranges are split into pages of PAGE_SIZE rows, cached with key
+# (op_id, stream kind, stream id, page number), where stream kind is
+# 'input_streams', 'output_streams' or 'internal_streams'.
+# - when a range is served, the next READ_AHEAD_PAGES pages are
+#   fetched in the background (the GUI is probably scrolling).
+# - concurrent requests for the same page (e.g. from several GUI
+#   clients) share a single request to the daemon.
+# - pages of an operator are dropped when the context notifies that
+#   its results are obsolete (links or parameters changed).
+
+PAGE_SIZE = 100
+READ_AHEAD_PAGES = 2
+MAX_CACHED_PAGES = 1000
+
+class PageCache(object):
+    def __init__(self, max_pages = MAX_CACHED_PAGES):
+        self.max_pages = max_pages
+        self.pages = collections.OrderedDict()  # key -> rows
+        self.pending = {}                       # key -> AsyncResult
+        self.generations = collections.defaultdict(int) # op_id -> generation
+    def get_range(self, op, kind, stream_id, row_start, row_end):
+        if row_end <= row_start:
+            return []
+        first_page = row_start // PAGE_SIZE
+        last_page = (row_end - 1) // PAGE_SIZE
+        async_pages = [ self.get_page_async(op, kind, stream_id, page) \
+                        for page in range(first_page, last_page + 1) ]
+        rows = []
+        for async_page in async_pages:
+            page_rows = async_page.get()
+            if page_rows == None:
+                return None     # e.g. input stream not connected
+            rows.extend(page_rows)
+            if len(page_rows) < PAGE_SIZE:
+                break   # end of stream
+        else:
+            # read-ahead
+            for page in range(last_page + 1, last_page + 1 + READ_AHEAD_PAGES):
+                self.get_page_async(op, kind, stream_id, page)
+        offset = first_page * PAGE_SIZE
+        return rows[row_start - offset:row_end - offset]
+    def get_page_async(self, op, kind, stream_id, page):
+        key = (op.op_id, kind, stream_id, page)
+        async_page = self.pending.get(key)
+        if async_page != None:
+            return async_page
+        async_page = AsyncResult()
+        rows = self.pages.get(key)
+        if rows != None:
+            self.pages.move_to_end(key)
+            async_page.set(rows)
+        else:
+            self.pending[key] = async_page
+            gevent.spawn(self.fetch, op, key, async_page)
+        return async_page
+    def fetch(self, op, key, async_page):
+        op_id, kind, stream_id, page = key
+        generation = self.generations[op_id]
+        try:
+            stream = getattr(op, kind)[stream_id]
+            rows = stream.get_range(page * PAGE_SIZE, (page + 1) * PAGE_SIZE)
+        except Exception as e:
+            async_page.set_exception(e)
+        else:
+            # if the operator was invalidated in the meantime,
+            # these rows may be obsolete: do not keep them.
+            # (rows is None if the stream is not available, e.g.
+            # an input stream not connected.)
+            if rows != None and self.generations[op_id] == generation:
+                self.store(key, rows)
+            async_page.set(rows)
+        finally:
+            if self.pending.get(key) is async_page:
+                del self.pending[key]
+    def store(self, key, rows):
+        self.pages[key] = rows
+        while len(self.pages) > self.max_pages:
+            self.pages.popitem(last = False)
+    def invalidate(self, op_ids):
+        op_ids = set(op_ids)
+        for op_id in op_ids:
+            self.generations[op_id] += 1
+        for entries in (self.pages, self.pending):
+            for key in tuple(entries):
+                if key[0] in op_ids:
+                    del entries[key]
@@ -8,6 +8,10 @@ class GuiToHubAPI(object):
     def list_operators_classes(self):
         return self.context.list_op_classes_serializable()
     
+    # RPC metrics of the hub and of each daemon
+    def get_metrics(self):
+        return self.context.get_metrics()
+    
     def list_nObjets(self,n,nom):
         return [{'nom':nom+str(i),'valeur':i} for i in range(n)]  
     
@@ -23,8 +27,12 @@ class GuiToHubAPI(object):
     def get_operator_instance_info(self, op_id):
         return self.context.op_instances[op_id].get_info_serializable()
     
+    # returns info about all operator instances
+    def list_operators_instance_info(self):
+        return self.context.list_op_instances_info_serializable()
+    
     def set_parameter_value(self, op_id, param_id, value):
-        return self.context.op_instances[op_id].parameters[param_id].set_value(value)
+        return self.context.set_parameter_value(op_id, param_id, value)
     
     def create_link(self, src_op_id, src_out_id, dst_op_id, dst_in_id):
         return self.context.create_link(src_op_id, src_out_id, dst_op_id, dst_in_id)
@@ -33,13 +41,13 @@ class GuiToHubAPI(object):
         return self.context.delete_link(link_id)
     
     def get_operator_input_range(self, op_id, in_id, row_start, row_end):
-        return self.context.op_instances[op_id].input_streams[in_id].get_range(row_start, row_end)
+        return self.context.get_stream_range(op_id, 'input_streams', in_id, row_start, row_end)
     
     def get_operator_output_range(self, op_id, out_id, row_start, row_end):
-        return self.context.op_instances[op_id].output_streams[out_id].get_range(row_start, row_end)
+        return self.context.get_stream_range(op_id, 'output_streams', out_id, row_start, row_end)
 
     def get_operator_internal_range(self, op_id, intern_id, row_start, row_end):
-        return self.context.op_instances[op_id].internal_streams[intern_id].get_range(row_start, row_end)
+        return self.context.get_stream_range(op_id, 'internal_streams', intern_id, row_start, row_end)
 
     def get_operator_file_content(self, op_id, file_path):
         return self.context.op_instances[op_id].get_file_content(file_path)
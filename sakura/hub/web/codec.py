@@ -0,0 +1,119 @@
+import json, struct, zlib
+
+# Binary encoding of the responses sent to the GUI.
+# (see function decode_message() in js/websocket.js for the other end)
+#
+# The GUI selects this protocol, and optionally compression, when it
+# opens the websocket (/websockets/rpc?format=binary&compress=deflate).
+# Requests are still sent by the GUI as JSON text messages.
+#
+# message: flags (1 byte, bit 0: payload is zlib-compressed), payload
+# payload: an encoded value, i.e. a type tag (1 byte) followed by:
+# - NULL, FALSE, TRUE: nothing
+# - INT: int32, FLOAT: float64
+# - STR: length (uint32) and utf-8 bytes
+# - LIST: number of items (uint32) and encoded items
+# - DICT: number of items (uint32) and (encoded key, encoded value) pairs
+# - TABLE: a list of rows (e.g. the result of a get_range() call),
+#   encoded column by column: number of rows (uint32), number of
+#   columns (uint8), and for each column a column tag (1 byte) followed by:
+#   - COL_INT: int32 values, COL_FLOAT: float64 values
+#   - COL_STR: lengths (uint32 each) then utf-8 bytes of all values
+#   - COL_ANY: encoded values
+# All numbers are little-endian.
+
+NULL, FALSE, TRUE, INT, FLOAT, STR, LIST, DICT, TABLE = range(9)
+COL_INT, COL_FLOAT, COL_STR, COL_ANY = range(4)
+
+FLAG_COMPRESSED = 1
+COMPRESS_MIN_SIZE = 1024
+
+INT32_MIN, INT32_MAX = -(1 << 31), (1 << 31) - 1
+UINT32 = struct.Struct('<I')
+
+def is_int32(val):
+    return type(val) is int and INT32_MIN <= val <= INT32_MAX
+
+def is_table(obj):
+    if len(obj) < 2 or not isinstance(obj[0], (list, tuple)):
+        return False
+    num_cols = len(obj[0])
+    if num_cols == 0 or num_cols > 255:
+        return False
+    for row in obj:
+        if not isinstance(row, (list, tuple)) or len(row) != num_cols:
+            return False
+    return True
+
+def encode_column(values, out):
+    if all(is_int32(val) for val in values):
+        out.append(COL_INT)
+        out += struct.pack('<%di' % len(values), *values)
+    elif all(type(val) in (int, float) for val in values):
+        out.append(COL_FLOAT)
+        out += struct.pack('<%dd' % len(values), *values)
+    elif all(type(val) is str for val in values):
+        out.append(COL_STR)
+        encoded = tuple(val.encode('utf-8') for val in values)
+        out += struct.pack('<%dI' % len(values), *(len(b) for b in encoded))
+        out += b''.join(encoded)
+    else:
+        out.append(COL_ANY)
+        for val in values:
+            encode_value(val, out)
+
+def encode_value(obj, out):
+    if obj is None:
+        out.append(NULL)
+    elif obj is False:
+        out.append(FALSE)
+    elif obj is True:
+        out.append(TRUE)
+    elif is_int32(obj):
+        out.append(INT)
+        out += struct.pack('<i', obj)
+    elif isinstance(obj, (int, float)):
+        out.append(FLOAT)
+        out += struct.pack('<d', obj)
+    elif isinstance(obj, str):
+        encoded = obj.encode('utf-8')
+        out.append(STR)
+        out += UINT32.pack(len(encoded))
+        out += encoded
+    elif isinstance(obj, dict):
+        out.append(DICT)
+        out += UINT32.pack(len(obj))
+        for key, val in obj.items():
+            encode_value(str(key), out)
+            encode_value(val, out)
+    elif isinstance(obj, (list, tuple)):
+        if is_table(obj):
+            out.append(TABLE)
+            out += UINT32.pack(len(obj))
+            out.append(len(obj[0]))
+            for values in zip(*obj):
+                encode_column(values, out)
+        else:
+            out.append(LIST)
+            out += UINT32.pack(len(obj))
+            for item in obj:
+                encode_value(item, out)
+    else:
+        # other objects are not expected, send them as strings.
+        encode_value(str(obj), out)
+
+def encode_message(obj, compress):
+    payload = bytearray()
+    encode_value(obj, payload)
+    if compress and len(payload) >= COMPRESS_MIN_SIZE:
+        return bytes((FLAG_COMPRESSED,)) + zlib.compress(payload)
+    return bytes((0,)) + payload
+
+# protocol object for LocalAPIHandler (see manager.py)
+class BinaryGuiProtocol(object):
+    def __init__(self, compress):
+        self.compress = compress
+    def load(self, f):
+        return json.load(f)
+    def dump(self, obj, f):
+        f.write(encode_message(obj, self.compress))
@@ -1,19 +1,23 @@
 import bottle
 from gevent.pywsgi import WSGIServer
 from geventwebsocket.handler import WebSocketHandler
-from sakura.hub.web.manager import rpc_manager
+from sakura.hub.web.manager import rpc_manager, get_client_id
+from sakura.hub.web.scheduler import gui_scheduler
 from sakura.hub.web.bottle import bottle_get_wsock
 from sakura.hub.tools import monitored
 import sakura.hub.conf as conf
 
 def web_greenlet(context, webapp_path):
+    gui_scheduler.configure(conf.gui_max_requests,
+                            conf.gui_max_requests_per_client)
     app = bottle.Bottle()
 
     @app.route('/websockets/rpc')
     @monitored
     def handle_rpc_websocket():
         wsock = bottle_get_wsock(bottle.request)
-        rpc_manager(context, wsock)
+        rpc_manager(context, wsock, bottle.request.query,
+                    get_client_id(bottle.request))
 
     # if no route was found above, look for static files in webapp subdir
     @app.route('/')
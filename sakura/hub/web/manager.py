@@ -1,34 +1,66 @@
 import json, collections
 from sakura.common.io import LocalAPIHandler
 from sakura.hub.web.api import GuiToHubAPI
+from sakura.hub.web.codec import BinaryGuiProtocol
+from sakura.hub.web.scheduler import gui_scheduler
 
 # caution: the object should be sent all at once,
 # otherwise it will be received as several messages
 # on the websocket. Thus we buffer possibly several
 # writes, and send the whole buffer when we get a
 # flush() call.
+# Writes may be text (json protocol) or bytes (binary
+# protocol), the latter being sent as a binary message.
 class FileWSock(object):
     def __init__(self, wsock):
         self.wsock = wsock
-        self.msg = ''
+        self.parts = []
     def write(self, s):
-        self.msg += s
+        self.parts.append(s)
     def read(self):
         msg = self.wsock.receive()
         if msg == None:
             msg = ''
         return msg
     def flush(self):
-        self.wsock.send(self.msg)
-        self.msg = ''
+        parts, self.parts = self.parts, []
+        if len(parts) == 0:
+            return
+        if isinstance(parts[0], str):
+            self.wsock.send(''.join(parts))
+        else:
+            self.wsock.send(b''.join(parts), binary = True)
 
-def rpc_manager(context, wsock):
+# the GUI selects the format of responses when opening
+# the websocket, e.g. /websockets/rpc?format=binary&compress=deflate
+# (default is json).
+def get_protocol(query):
+    if query.get('format') == 'binary':
+        return BinaryGuiProtocol(query.get('compress') == 'deflate')
+    return json
+
+# the GUI identifies the page opening the websocket, e.g.
+# /websockets/rpc?session=<random id>, see scheduler.py.
+# (other clients are identified by their address)
+def get_client_id(request):
+    session = request.query.get('session')
+    if session == None:
+        return request.remote_addr
+    return 'session:' + session
+
+# requests are handled concurrently, see scheduler.py.
+def rpc_manager(context, wsock, query = None, client_id = None):
     print('New GUI RPC connection.')
+    if query == None:
+        query = {}
     # make wsock a file-like object
     f = FileWSock(wsock)
     # manage api requests
     local_api = GuiToHubAPI(context)
-    handler = LocalAPIHandler(f, json, local_api)
-    handler.loop()
+    connection = gui_scheduler.connection(client_id)
+    handler = LocalAPIHandler(f, get_protocol(query), local_api, connection)
+    try:
+        handler.loop()
+    finally:
+        connection.close()
     print('GUI RPC disconnected.')
-
@@ -0,0 +1,127 @@
+import collections, gevent
+from gevent.event import Event
+
+# Scheduling of GUI requests.
+# Requests received on a websocket are handled concurrently, each one
+# in its own greenlet (see LocalAPIHandler), thus a slow request does
+# not delay the ones received after it.
+# The number of requests running at the same time is bounded, per
+# client (i.e. per GUI session: the GUI opens several websockets, see
+# get_client_id() in manager.py) and for the whole hub. Requests wait for a slot in FIFO order, but
+# control calls (e.g. list_daemons, set_parameter_value) are given
+# free slots before bulk calls (ranges of rows). A batch of calls
+# gets the priority of its most urgent call. Moreover, bulk calls
+# may only use a part of the slots (BULK_SLOTS_RATIO), thus control
+# calls do not wait for slow bulk calls.
+
+CONTROL, BULK = 0, 1
+BULK_CALLS = ( 'get_operator_input_range',
+               'get_operator_output_range',
+               'get_operator_internal_range' )
+DEFAULT_MAX_REQUESTS = 64
+DEFAULT_MAX_REQUESTS_PER_CLIENT = 8
+BULK_SLOTS_RATIO = 0.75
+
+def get_priority(path, args = ()):
+    if path == None:
+        # batch of calls, args is the list of (path, args, kwargs)
+        return min((get_priority(call[0]) for call in args), default = CONTROL)
+    if path[-1] in BULK_CALLS:
+        return BULK
+    return CONTROL
+
+class RequestSlots(object):
+    def __init__(self, size):
+        self.configure(size)
+        self.active = { CONTROL: 0, BULK: 0 }
+        self.waiters = { CONTROL: collections.deque(), BULK: collections.deque() }
+    def configure(self, size):
+        self.size = size
+        self.bulk_size = max(int(size * BULK_SLOTS_RATIO), 1)
+    def can_start(self, priority):
+        if self.active[CONTROL] + self.active[BULK] >= self.size:
+            return False
+        return priority == CONTROL or self.active[BULK] < self.bulk_size
+    def acquire(self, priority):
+        if len(self.waiters[priority]) == 0 and self.can_start(priority):
+            self.active[priority] += 1
+            return
+        event = Event()
+        self.waiters[priority].append(event)
+        try:
+            event.wait()
+        except BaseException:
+            # e.g. the greenlet was killed
+            if event.is_set():
+                self.release(priority)  # the slot was given to us
+            else:
+                self.waiters[priority].remove(event)
+            raise
+    def release(self, priority):
+        self.active[priority] -= 1
+        # give free slots to waiting requests, control calls first
+        for priority in (CONTROL, BULK):
+            waiters = self.waiters[priority]
+            while len(waiters) > 0 and self.can_start(priority):
+                self.active[priority] += 1
+                waiters.popleft().set()
+
+# requests of a websocket connection.
+# this object is given to LocalAPIHandler as its greenlets pool.
+class GuiConnection(object):
+    def __init__(self, scheduler, client_id):
+        self.scheduler = scheduler
+        self.client_id = client_id
+        self.client_slots = scheduler.attach_client(client_id)
+        self.greenlets = { CONTROL: set(), BULK: set() }
+    # (args: args, kwargs and size of the request, see LocalAPIHandler)
+    def spawn(self, func, req_id, path, *args):
+        priority = get_priority(path, args[0])
+        g = gevent.spawn(self.run, priority, func, req_id, path, *args)
+        self.greenlets[priority].add(g)
+        g.link(self.greenlets[priority].discard)
+    def run(self, priority, func, *args):
+        self.client_slots.acquire(priority)
+        try:
+            self.scheduler.slots.acquire(priority)
+            try:
+                func(*args)
+            finally:
+                self.scheduler.slots.release(priority)
+        finally:
+            self.client_slots.release(priority)
+    def close(self):
+        # the websocket is closed, responses could not be sent anyway.
+        # bulk calls only read data, thus we can interrupt them, but
+        # control calls may change the state of the hub or daemons
+        # (e.g. create_link), thus we let them complete.
+        gevent.killall(tuple(self.greenlets[BULK]))
+        self.scheduler.detach_client(self.client_id)
+
+class GuiScheduler(object):
+    def __init__(self):
+        self.slots = RequestSlots(DEFAULT_MAX_REQUESTS)
+        self.max_per_client = DEFAULT_MAX_REQUESTS_PER_CLIENT
+        self.clients = {}   # client_id -> [ slots, number of connections ]
+    def configure(self, max_requests, max_per_client):
+        if max_requests != None:
+            self.slots.configure(max_requests)
+        if max_per_client != None:
+            self.max_per_client = max_per_client
+    def connection(self, client_id):
+        return GuiConnection(self, client_id)
+    def attach_client(self, client_id):
+        client = self.clients.get(client_id)
+        if client == None:
+            client = [ RequestSlots(self.max_per_client), 0 ]
+            self.clients[client_id] = client
+        client[1] += 1
+        return client[0]
+    def detach_client(self, client_id):
+        client = self.clients[client_id]
+        client[1] -= 1
+        if client[1] == 0:
+            del self.clients[client_id]
+
+# hub-wide instance (configured by web_greenlet())
+gui_scheduler = GuiScheduler()
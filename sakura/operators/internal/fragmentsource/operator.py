@@ -1,43 +1,165 @@
 #!/usr/bin/env python
+import time, gevent
 from sakura.daemon.processing.operator import InternalOperator
 
 # This internal operator (not accessible from users)
 # is used when a user links 2 operators running in
 # 2 differents daemons. As a result, each daemon
-# is running a fragment of the workflow, and the
-# hub, together with this operator, passes the data
-# between these fragments.
+# is running a fragment of the workflow, and this
+# operator passes the data between these fragments.
 # The FragmentSourceOperator is internally added as
 # a source of the 2nd workflow fragment.
-# It pulls data from the hub (and the hub pulls data
-# from the output of the 1st fragment) and passes this
-# data to the next operator of the 2nd fragment.
+# It pulls data from the output of the 1st fragment and
+# passes this data to the next operator of the 2nd fragment.
+# Data is pulled directly from the remote daemon if
+# possible (peer_endpoint), or through the hub otherwise.
+# The connection to the remote daemon is obtained from
+# PeerConnections for each computation, thus it is re-established
+# if it was lost.
 
+# Queries (see query.py) are forwarded to the remote daemon, thus
+# only the needed columns and rows are transferred.
+# Data is pulled through a cursor opened on the remote daemon,
+# batch after batch. The batch size is adapted to keep the
+# duration of each fetch close to FRAGMENT_FETCH_DELAY.
+# If the cursor is lost (the remote daemon closed it because it was
+# idle for too long, e.g. this stream was parked in a checkpoint, see
+# engine.py, or the connection was lost), a new cursor is opened and
+# the rows already transmitted are skipped.
 FRAGMENT_BUFFER = 1000
+FRAGMENT_BUFFER_MIN = 100
+FRAGMENT_BUFFER_MAX = 100000
+FRAGMENT_FETCH_DELAY = 0.1
+FRAGMENT_REOPEN_ATTEMPTS = 3
 
 class FragmentSourceOperator(InternalOperator):
-    def __init__(self, hub, remote_op_id, remote_out_id):
+    def __init__(self, hub, remote_op_id, remote_out_id,
+                 peers = None, peer_endpoint = None):
         super().__init__()
+        self.peers = peers
+        self.peer_endpoint = peer_endpoint
+        self.remote_op_id = remote_op_id
+        self.remote_out_id = remote_out_id
         remote_op = hub.context.op_instances[remote_op_id]
         self.remote_out_stream = remote_op.output_streams[remote_out_id]
+        self.remote_daemon_api = remote_op.daemon.api
     def construct(self):
         out_stream_info = self.remote_out_stream.get_info_serializable()
         # just one output, copy info from remote stream
+        # (the length of the remote stream is not copied: it may be
+        # computed from the stats of the remote stream, which are
+        # obsolete as soon as the remote stream changes.)
         self.output_stream = self.register_output(
-                out_stream_info['label'], self.compute)
-        self.output_stream.length = out_stream_info['length']
+                out_stream_info['label'], self.compute, None, self.compute_query)
         for col_label, col_type in out_stream_info['columns']:
             self.output_stream.add_column(col_label, eval(col_type))
-    def compute(self):
+    def open_cursor(self, query):
+        # returns the api we should use, the cursor id, and the
+        # length of the stream (or None if unknown)
+        args = (self.remote_op_id, self.remote_out_id)
+        if query != None:
+            args += (query.get_serializable(),)
+        if self.peer_endpoint != None:
+            peer_api = self.peers.get_api(self.peer_endpoint)
+            if peer_api != None:
+                try:
+                    return (peer_api,) + tuple(peer_api.open_cursor(*args))
+                except ConnectionError:
+                    pass    # fallback to the hub relay
+        return (self.remote_daemon_api,) + \
+                    tuple(self.remote_daemon_api.open_cursor(*args))
+    # returns None as rows if the cursor was lost (closed by the
+    # remote daemon, or connection lost).
+    def fetch(self, api, cursor_id, batch_size):
+        t0 = time.time()
+        try:
+            rows = api.fetch(cursor_id, batch_size)
+        except ConnectionError:
+            rows = None
+        return rows, time.time() - t0
+    def close_cursor(self, api, cursor_id):
+        try:
+            api.close_cursor(cursor_id)
+        except ConnectionError:
+            pass
+    # returns False if the stream has less than num_rows rows, or
+    # None if the cursor was lost again.
+    def skip(self, api, cursor_id, num_rows):
+        while num_rows > 0:
+            batch_size = min(num_rows, FRAGMENT_BUFFER_MAX)
+            rows, duration = self.fetch(api, cursor_id, batch_size)
+            if rows == None:
+                return None
+            if len(rows) < batch_size:
+                return False
+            num_rows -= batch_size
+        return True
+    # open a new cursor (through the hub if the direct connection is
+    # lost) and skip the rows already transmitted.
+    # returns None as cursor id if the stream has less rows now.
+    def reopen_cursor(self, query, num_rows):
+        for attempt in range(FRAGMENT_REOPEN_ATTEMPTS):
+            api, cursor_id, length = self.open_cursor(query)
+            skipped = self.skip(api, cursor_id, num_rows)
+            if skipped == True:
+                return api, cursor_id
+            self.close_cursor(api, cursor_id)
+            if skipped == False:
+                return api, None
+        raise ConnectionError('could not reopen the cursor of the remote stream.')
+    def initial_batch_size(self, length):
+        # the remote stream may know its length (declared, or
+        # computed during a previous scan, see stats.py): if so,
+        # try to get everything with the first fetch.
+        if length == None:
+            return FRAGMENT_BUFFER
+        return min(max(length + 1, FRAGMENT_BUFFER_MIN), FRAGMENT_BUFFER_MAX)
+    def adapt_batch_size(self, batch_size, duration):
+        if duration < FRAGMENT_FETCH_DELAY / 2:
+            return min(batch_size * 2, FRAGMENT_BUFFER_MAX)
+        if duration > FRAGMENT_FETCH_DELAY * 2:
+            return max(batch_size // 2, FRAGMENT_BUFFER_MIN)
+        return batch_size
+    # the remote operator (or one upstream) changed
+    def invalidate(self):
+        self.version += 1
+        super().invalidate()
+    def compute_query(self, query):
+        return self.compute(query)
+    def compute(self, query = None):
         # we just pull and transmit the output from the remote operator.
         # however, for performance reasons, we do not pull rows 1 by 1,
-        # we pull FRAGMENT_BUFFER rows at a time.
-        row_idx = 0
-        last_row_idx = 0
-        while True:
-            for row in self.remote_out_stream.get_range(row_idx, row_idx + FRAGMENT_BUFFER):
-                yield row
-                row_idx += 1
-            if row_idx < last_row_idx + FRAGMENT_BUFFER:
-                break
-            last_row_idx += FRAGMENT_BUFFER
+        # we pull batches of rows, and while the rows of a batch are
+        # consumed, the next batch is prefetched by another greenlet.
+        api, cursor_id, length = self.open_cursor(query)
+        batch_size = self.initial_batch_size(length)
+        prefetch = gevent.spawn(self.fetch, api, cursor_id, batch_size)
+        num_sent = 0
+        try:
+            while True:
+                rows, duration = prefetch.get()
+                if rows == None:
+                    # our cursor was lost
+                    prefetch = None
+                    api, cursor_id = self.reopen_cursor(query, num_sent)
+                    if cursor_id == None:
+                        break
+                    prefetch = gevent.spawn(self.fetch, api, cursor_id, batch_size)
+                    continue
+                if len(rows) < batch_size:
+                    # last batch (the remote cursor is closed)
+                    prefetch = None
+                    for row in rows:
+                        yield row
+                    break
+                batch_size = self.adapt_batch_size(batch_size, duration)
+                prefetch = gevent.spawn(self.fetch, api, cursor_id, batch_size)
+                num_sent += len(rows)
+                for row in rows:
+                    yield row
+        finally:
+            if prefetch != None:
+                # we were interrupted before the end of the stream.
+                # wait for the pending fetch and close the cursor.
+                prefetch.join()
+                self.close_cursor(api, cursor_id)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+from sakura.daemon.processing.aggregate import AggregateOperator, \
+            Count, Sum, MinMax, Variance, Histogram
+
+# see sakura/daemon/processing/aggregate.py
+# (the Mean operator is in its own directory)
+
+class CountOperator(AggregateOperator):
+    NAME = "Count"
+    SHORT_DESC = "Count the non-null values of a numeric column."
+    TAGS = [ "statistics", "aggregate" ]
+    AGGREGATE = Count
+
+class SumOperator(AggregateOperator):
+    NAME = "Sum"
+    SHORT_DESC = "Get the sum of a numeric column."
+    TAGS = [ "statistics", "aggregate" ]
+    AGGREGATE = Sum
+
+class MinMaxOperator(AggregateOperator):
+    NAME = "Min / Max"
+    SHORT_DESC = "Get the minimum and maximum values of a numeric column."
+    TAGS = [ "statistics", "aggregate" ]
+    AGGREGATE = MinMax
+
+class VarianceOperator(AggregateOperator):
+    NAME = "Variance"
+    SHORT_DESC = "Get the variance and standard deviation of a numeric column."
+    TAGS = [ "statistics", "aggregate" ]
+    AGGREGATE = Variance
+
+class HistogramOperator(AggregateOperator):
+    NAME = "Histogram"
+    SHORT_DESC = "Count the values of a numeric column per interval."
+    TAGS = [ "statistics", "aggregate" ]
+    AGGREGATE = Histogram
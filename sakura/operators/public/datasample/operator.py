@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 import random
+import numpy as np
 from sakura.daemon.processing.operator import Operator
+from sakura.daemon.processing.chunk import Chunk
 
 # info about output1
 OUTPUT1_COLUMNS = (
@@ -33,12 +35,12 @@ class DataSampleOperator(Operator):
         # - output1: dump of OUTPUT1 (see above)
         # - output2: dump of OUTPUT2 (randomly generated integers)
         # - output3: generate OUTPUT2_LENGTH random integers
-        output1 = self.register_output('People', self.compute1)
+        output1 = self.register_output('People', self.compute1, self.compute1_range)
         output1.length = len(OUTPUT1)
         for colname, coltype in OUTPUT1_COLUMNS:
             output1.add_column(colname, coltype)
         
-        output2 = self.register_output('1000 integers', self.compute2)
+        output2 = self.register_output('1000 integers', self.compute2, self.compute2_range)
         output2.length = OUTPUT2_LENGTH
         output2.add_column('Integers', int)
         
@@ -50,10 +52,14 @@ class DataSampleOperator(Operator):
     def compute1(self):
         for row in OUTPUT1:
             yield row
+    def compute1_range(self, row_start, row_end):
+        return OUTPUT1[row_start:row_end]
     def compute2(self):
         for row in OUTPUT2:
             yield row
+    def compute2_range(self, row_start, row_end):
+        return OUTPUT2[row_start:row_end]
     def compute3(self):
-        for row_idx in range(OUTPUT3_LENGTH):
-            yield (random.randint(0, 1000),)
+        # generate all values at once, in a chunk
+        yield Chunk((np.random.randint(0, 1001, OUTPUT3_LENGTH),))
 
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+import os, tempfile
+import sakura.daemon.conf as conf
+from sakura.daemon.processing.operator import Operator
+from sakura.daemon.processing.parameter import ComboParameter
+from sakura.daemon.processing.query import StreamQuery
+from sakura.daemon.processing.dataset import open_dataset, dataset_name
+
+# Reads one of the datasets listed in the 'external-datasets' entry
+# of the daemon conf (see sakura/daemon/processing/dataset.py).
+# Column files are memory-mapped, thus a range read, or a query
+# involving only some of the columns (see query.py), only reads the
+# corresponding parts of the files.
+
+CHUNK_SIZE = 65536
+
+def get_dataset_paths():
+    return getattr(conf, 'external_datasets', None) or []
+
+def get_cache_dir():
+    cache_dir = getattr(conf, 'datasets_cache_dir', None)
+    if cache_dir == None:
+        cache_dir = os.path.join(tempfile.gettempdir(), 'sakura-datasets')
+    return cache_dir
+
+class DatasetSelection(ComboParameter):
+    def get_possible_values(self):
+        return [ dataset_name(path) for path in get_dataset_paths() ]
+    def set_value(self, idx):
+        self.operator.load_dataset(get_dataset_paths()[idx])
+        self.value = idx
+        self.notify_change()
+
+class DatasetOperator(Operator):
+    NAME = "Dataset"
+    SHORT_DESC = "Read a dataset file (memory-mapped)."
+    TAGS = [ "datasource" ]
+    def construct(self):
+        # outputs
+        # (columns are declared when the dataset is selected)
+        self.output = self.register_output('Dataset', self.compute, self.compute_range,
+                                           self.compute_query)
+        # parameters
+        self.dataset_param = self.register_parameter('Dataset', DatasetSelection)
+        self.dataset = None
+    def load_dataset(self, path):
+        self.dataset = open_dataset(path, get_cache_dir())
+        # the list of columns is shared with connected input streams,
+        # thus we update it in place.
+        del self.output.columns[:]
+        for col_label, col_type in self.dataset.columns:
+            self.output.add_column(col_label, col_type)
+        self.output.length = self.dataset.length
+    def compute(self):
+        return self.compute_range(0, self.output.length)
+    def compute_range(self, row_start, row_end):
+        if self.dataset == None:
+            return iter(())
+        return self.dataset.chunks(row_start, row_end, CHUNK_SIZE)
+    # only the columns involved in the query are read.
+    def compute_query(self, query):
+        if self.dataset == None:
+            return iter(())
+        if query.columns == None:
+            col_indexes = list(range(len(self.output.columns)))
+        else:
+            col_indexes = list(query.columns)
+        for col_index, op, value in query.predicates:
+            if col_index not in col_indexes:
+                col_indexes.append(col_index)
+        # the same query, on the columns we read
+        position = { col_index: pos for pos, col_index in reversed(tuple(enumerate(col_indexes))) }
+        query = StreamQuery(
+            None if query.columns == None else range(len(query.columns)),
+            ((position[col_index], op, value) for col_index, op, value in query.predicates))
+        return query.apply(self.dataset.chunks(0, self.dataset.length,
+                                               CHUNK_SIZE, col_indexes))
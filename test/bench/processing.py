@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+import os, sys, json, time, argparse
+os.environ['UNIT_TEST'] = 'yes'
+sys.path.insert(0, '.')
+from sakura.daemon.processing.operator import Operator
+from sakura.daemon.processing.chunk import Chunk
+from sakura.daemon.processing.partition import partition_planner
+from sakura.operators.public.mean.operator import MeanOperator
+import numpy as np
+
+# Micro-benchmarks of sakura.daemon.processing (run from the root of
+# the repository, as test/unit/processing.py).
+#
+# Each benchmark is run several times and its best time is kept.
+# Times are divided by the time of a pure python calibration loop,
+# and only these relative times are stored in the baseline file, thus
+# they can be compared with the results obtained on another machine
+# (roughly).
+#
+# usage: test/bench/processing.py [--threshold 0.3] [--update-baseline]
+# exits with status 1 if a benchmark is slower than its baseline
+# by more than the threshold.
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'processing-baseline.json')
+DEFAULT_THRESHOLD = 0.3     # +30%
+REPEAT = 5
+STREAM_ROWS = 100000
+GRAPH_OPERATORS = 200
+PAGE_ROWS = 100
+PAGES = 100
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = 'Micro-benchmarks of the processing layer.')
+    parser.add_argument('--threshold', type = float, default = DEFAULT_THRESHOLD,
+                help = 'Max allowed slowdown compared to the baseline (0.3: +30%%)')
+    parser.add_argument('--baseline', default = BASELINE_FILE,
+                help = 'Baseline file (default: %(default)s)')
+    parser.add_argument('--update-baseline', action = 'store_true',
+                help = 'Store the results as the new baseline')
+    parser.add_argument('-o', '--output',
+                help = 'Also write the results (JSON) to this file')
+    return parser.parse_args()
+
+# operators
+# ---------
+class RowSource(Operator):
+    NAME = "Row source"
+    SHORT_DESC = "Rows, one by one."
+    TAGS = [ "testing" ]
+    def construct(self):
+        output = self.register_output('Rows', self.compute)
+        output.add_column('Index', int)
+        output.add_column('Value', float)
+        output.add_column('Label', str)
+    def compute(self):
+        for i in range(STREAM_ROWS):
+            yield (i, i / 2, 'row')
+
+class ChunkSource(Operator):
+    NAME = "Chunk source"
+    SHORT_DESC = "Rows, by chunks."
+    TAGS = [ "testing" ]
+    def construct(self):
+        output = self.register_output('Chunks', self.compute)
+        output.add_column('Index', int)
+        output.add_column('Value', float)
+    def compute(self):
+        for start in range(0, STREAM_ROWS, 4096):
+            index = np.arange(start, min(start + 4096, STREAM_ROWS))
+            yield Chunk((index, index / 2))
+
+def build_graph():
+    source = RowSource(0)
+    source.construct()
+    ops = [ source ]
+    for op_id in range(1, GRAPH_OPERATORS):
+        op = MeanOperator(op_id)
+        op.construct()
+        op.input_streams[0].connect(source.output_streams[0])
+        ops.append(op)
+    return ops
+
+# benchmarks
+# ----------
+def calibration():
+    total = 0
+    for i in range(1000000):
+        total += i % 7
+
+def bench_stream_iter():
+    op = RowSource(0)
+    op.construct()
+    for row in op.output_streams[0]:
+        pass
+
+def bench_stream_iter_chunks():
+    op = ChunkSource(0)
+    op.construct()
+    for row in op.output_streams[0]:
+        pass
+
+def bench_column_iter():
+    op = RowSource(0)
+    op.construct()
+    for value in op.output_streams[0].columns[1]:
+        pass
+
+# cold: a new operator for each read
+def make_bench_get_range(offset):
+    def bench_get_range():
+        op = RowSource(0)
+        op.construct()
+        op.output_streams[0].get_range(offset, offset + PAGE_ROWS)
+    return bench_get_range
+
+# warm: consecutive pages read on the same operator, each read
+# resumes the iteration parked by the previous one (checkpoint)
+def bench_get_range_pages():
+    op = RowSource(0)
+    op.construct()
+    stream = op.output_streams[0]
+    for row_start in range(0, PAGES * PAGE_ROWS, PAGE_ROWS):
+        stream.get_range(row_start, row_start + PAGE_ROWS)
+
+def bench_graph_auto_fill():
+    for op in build_graph():
+        op.auto_fill_parameters()
+
+def bench_graph_info():
+    ops = build_graph()
+    for op in ops:
+        op.auto_fill_parameters()
+    for op in ops:
+        op.get_info_serializable()
+
+BENCHMARKS = [
+    ('stream_iter', bench_stream_iter),
+    ('stream_iter_chunks', bench_stream_iter_chunks),
+    ('column_iter', bench_column_iter),
+] + [
+    ('get_range_%d' % offset, make_bench_get_range(offset)) \
+            for offset in (0, 1000, 10000, STREAM_ROWS - PAGE_ROWS)
+] + [
+    ('get_range_pages', bench_get_range_pages),
+    ('graph_auto_fill', bench_graph_auto_fill),
+    ('graph_info', bench_graph_info),
+]
+
+def best_time(f):
+    durations = []
+    for i in range(REPEAT):
+        t0 = time.perf_counter()
+        f()
+        durations.append(time.perf_counter() - t0)
+    return min(durations)
+
+def run():
+    # no process pool, no cache (not configured in UNIT_TEST mode):
+    # everything runs in this process.
+    partition_planner.configure(1)
+    durations = {}
+    for name, f in BENCHMARKS:
+        durations[name] = best_time(f)
+    # (calibration runs after the benchmarks, when the machine
+    # is warmed up)
+    calibration_time = best_time(calibration)
+    results = { name: dict(seconds = duration,
+                           relative = duration / calibration_time) \
+                for name, duration in durations.items() }
+    return calibration_time, results
+
+def compare(results, baseline, threshold):
+    failures = []
+    for name, result in results.items():
+        if name not in baseline:
+            print('%-20s %10.3f (no baseline)' % (name, result['relative']))
+            continue
+        ratio = result['relative'] / baseline[name]['relative']
+        status = 'ok'
+        if ratio > 1 + threshold:
+            status = 'REGRESSION'
+            failures.append(name)
+        print('%-20s %10.3f %10.3f %+7.1f%% %s' % (name, result['relative'],
+                baseline[name]['relative'], (ratio - 1) * 100, status))
+    return failures
+
+def main():
+    args = parse_args()
+    calibration_time, results = run()
+    if args.output != None:
+        output = dict(calibration_seconds = calibration_time, results = results)
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent = 4)
+    if args.update_baseline:
+        # (absolute times are specific to this machine)
+        baseline = { name: dict(relative = result['relative']) \
+                     for name, result in results.items() }
+        with open(args.baseline, 'w') as f:
+            json.dump(dict(results = baseline), f, indent = 4)
+        print('Baseline stored in %s.' % args.baseline)
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    print('%-20s %10s %10s %8s' % ('benchmark', 'current', 'baseline', 'diff'))
+    failures = compare(results, baseline, args.threshold)
+    if len(failures) > 0:
+        print('Slower than the baseline by more than %d%%: %s' % \
+                    (args.threshold * 100, ', '.join(failures)))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+import os, sys, json, time, random, shutil, socket, argparse, platform, \
+       subprocess, tempfile
+from websocket import create_connection
+
+# End-to-end benchmark: starts a hub and daemons on localhost (as
+# test/run-hub.sh and test/run-daemon.sh do), builds workflows through
+# the web RPC API (as the GUI does), and reports latencies and
+# throughputs as JSON, for comparison between runs.
+#
+# - daemon 0 runs a Dataset operator (reading a generated CSV file)
+#   and a Mean operator.
+# - daemon 1 runs a Mean operator (cross-daemon links).
+#
+# usage: test/bench/run-bench.py [-o results.json] [--rows N] [...]
+#        (run test/bench/run-bench.py -h for all options)
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DAEMON_OPERATORS = (
+    ('dataset', 'mean'),
+    ('mean',)
+)
+STARTUP_TIMEOUT = 30.0
+PAGE_ROWS = 100
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = 'End-to-end benchmark of sakura.')
+    parser.add_argument('-o', '--output',
+                help = 'Write results to this file (default: stdout)')
+    parser.add_argument('--rows', type = int, default = 500000,
+                help = 'Number of rows of the generated dataset')
+    parser.add_argument('--repeat', type = int, default = 5,
+                help = 'Number of repetitions of throughput measures')
+    parser.add_argument('--calls', type = int, default = 200,
+                help = 'Number of calls of latency measures')
+    parser.add_argument('--web-port', type = int, default = 18081)
+    parser.add_argument('--hub-port', type = int, default = 20432)
+    parser.add_argument('--data-port', type = int, default = 20440,
+                help = 'Data port of daemon 0 (daemon i uses data-port + i)')
+    parser.add_argument('--keep-logs', action = 'store_true',
+                help = 'Do not remove the temporary directory (logs, conf files)')
+    return parser.parse_args()
+
+# summary of a list of durations (in seconds), in milliseconds
+def summarize(durations):
+    durations = sorted(durations)
+    def percentile(p):
+        return durations[min(int(len(durations) * p / 100), len(durations) - 1)] * 1000
+    return dict(n = len(durations),
+                mean_ms = sum(durations) / len(durations) * 1000,
+                min_ms = durations[0] * 1000,
+                p50_ms = percentile(50),
+                p90_ms = percentile(90),
+                p99_ms = percentile(99),
+                max_ms = durations[-1] * 1000)
+
+def timed(f, *args):
+    t0 = time.perf_counter()
+    res = f(*args)
+    return res, time.perf_counter() - t0
+
+# setup
+# -----
+def generate_dataset(path, rows):
+    rand = random.Random(42)
+    cities = ('Paris', 'Grenoble', 'Lyon', 'Marseille', 'Saint-Étienne')
+    with open(path, 'w') as f:
+        f.write('Id,Value,City,Score\n')
+        for i in range(rows):
+            f.write('%d,%.3f,%s,%d\n' % (i, rand.random() * 1000,
+                        rand.choice(cities), rand.randint(0, 100)))
+
+def write_conf(path, conf):
+    with open(path, 'w') as f:
+        json.dump(conf, f, indent = 4)
+
+class Backend(object):
+    def __init__(self, args, tmp_dir, dataset_path):
+        self.args = args
+        self.tmp_dir = tmp_dir
+        self.dataset_path = dataset_path
+        self.processes = []
+    def spawn(self, name, cmd):
+        log = open(os.path.join(self.tmp_dir, name + '.log'), 'w')
+        self.processes.append(subprocess.Popen(cmd, cwd = REPO_DIR,
+                    stdout = log, stderr = subprocess.STDOUT))
+    def start(self):
+        args = self.args
+        hub_conf = os.path.join(self.tmp_dir, 'hub.conf')
+        write_conf(hub_conf, {
+            'web-port': args.web_port,
+            'hub-port': args.hub_port,
+            'external-datasets': []
+        })
+        self.spawn('hub', [ sys.executable, 'hub.py', '-f', hub_conf, 'web_interface' ])
+        # (the hub opens its web port and the port for daemons at
+        # the same time, we only probe the web port)
+        wait_port(args.web_port)
+        for daemon_index, operators in enumerate(DAEMON_OPERATORS):
+            daemon_dir = os.path.join(self.tmp_dir, 'daemon%d' % daemon_index)
+            operators_dir = os.path.join(daemon_dir, 'operators')
+            for operator in operators:
+                shutil.copytree(os.path.join(REPO_DIR, 'sakura', 'operators', 'public', operator),
+                                os.path.join(operators_dir, operator))
+            daemon_conf = os.path.join(daemon_dir, 'daemon.conf')
+            write_conf(daemon_conf, {
+                'hub-host': 'localhost',
+                'hub-port': args.hub_port,
+                'daemon-desc': 'daemon %d' % daemon_index,
+                'operators-dir': operators_dir,
+                'data-port': args.data_port + daemon_index,
+                'datasets-cache-dir': os.path.join(self.tmp_dir, 'datasets'),
+                'external-datasets': [ self.dataset_path ]
+            })
+            self.spawn('daemon%d' % daemon_index,
+                       [ sys.executable, 'daemon.py', '-f', daemon_conf ])
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+def wait_port(port):
+    deadline = time.time() + STARTUP_TIMEOUT
+    while True:
+        try:
+            socket.create_connection(('localhost', port)).close()
+            return
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+
+# web API client, as the GUI (see test/web-api-test.py)
+class WebAPI(object):
+    def __init__(self, web_port):
+        self.wsock = create_connection('ws://localhost:%d/websockets/rpc' % web_port)
+    def call(self, name, *args):
+        self.wsock.send(json.dumps((0, (name,), args, {})))
+        return json.loads(self.wsock.recv())[1]
+    def close(self):
+        self.wsock.close()
+
+def wait_daemons(api, num_daemons):
+    deadline = time.time() + STARTUP_TIMEOUT
+    while len(api.call('list_daemons')) < num_daemons:
+        if time.time() > deadline:
+            raise Exception('Daemons did not register in time.')
+        time.sleep(0.2)
+
+# operator class ids, per (daemon name, class name)
+def get_classes(api):
+    return { (cls['daemon'], cls['name']): cls['id'] \
+             for cls in api.call('list_operators_classes') }
+
+# benchmarks
+# ----------
+def bench_rpc(api, ds_op, calls):
+    hub_durations, daemon_durations = [], []
+    for i in range(calls):
+        hub_durations.append(timed(api.call, 'list_daemons')[1])
+        daemon_durations.append(timed(api.call, 'get_operator_instance_info', ds_op)[1])
+    return {
+        'rpc_hub': summarize(hub_durations),
+        'rpc_daemon': summarize(daemon_durations)
+    }
+
+def bench_create_operator(api, cls_id, calls):
+    create, delete = [], []
+    for i in range(calls):
+        info, duration = timed(api.call, 'create_operator_instance', cls_id)
+        create.append(duration)
+        delete.append(timed(api.call, 'delete_operator_instance', info['op_id'])[1])
+    return {
+        'operator_create': summarize(create),
+        'operator_delete': summarize(delete)
+    }
+
+def bench_create_link(api, ds_op, mean_op, calls):
+    create, delete = [], []
+    for i in range(calls):
+        link_id, duration = timed(api.call, 'create_link', ds_op, 0, mean_op, 0)
+        create.append(duration)
+        delete.append(timed(api.call, 'delete_link', link_id)[1])
+    return {
+        'link_create': summarize(create),
+        'link_delete': summarize(delete)
+    }
+
+# first read of a page (cold), then a second one (warm: hub page cache)
+def bench_pages(api, ds_op, rows):
+    results = {}
+    for offset in (0, rows // 100, rows // 10, rows // 2, rows - PAGE_ROWS):
+        cold = timed(api.call, 'get_operator_output_range', ds_op, 0, offset, offset + PAGE_ROWS)[1]
+        warm = timed(api.call, 'get_operator_output_range', ds_op, 0, offset, offset + PAGE_ROWS)[1]
+        results[str(offset)] = dict(cold_ms = cold * 1000, warm_ms = warm * 1000)
+    return { 'page_latency': results }
+
+# a new Mean operator is created for each measure, thus the
+# computation is not served from a cache.
+def bench_throughput(api, ds_op, mean_cls_id, rows, repeat):
+    durations = []
+    for i in range(repeat):
+        mean_op = api.call('create_operator_instance', mean_cls_id)['op_id']
+        api.call('create_link', ds_op, 0, mean_op, 0)
+        api.call('set_parameter_value', mean_op, 0, 1)  # 'Value' column
+        durations.append(timed(api.call, 'get_operator_output_range', mean_op, 0, 0, 1)[1])
+        api.call('delete_operator_instance', mean_op)
+    summary = summarize(durations)
+    summary.update(rows = rows,
+                   rows_per_s = rows / (summary['p50_ms'] / 1000))
+    return summary
+
+def run(args, api):
+    results = {}
+    wait_daemons(api, len(DAEMON_OPERATORS))
+    classes = get_classes(api)
+    ds_cls = classes[('daemon 0', 'Dataset')]
+    mean_cls = [ classes[('daemon %d' % i, 'Mean')] for i in range(len(DAEMON_OPERATORS)) ]
+    # conversion of the CSV file is not measured: the first
+    # operator instance triggers it.
+    ds_op = api.call('create_operator_instance', ds_cls)['op_id']
+    results.update(bench_rpc(api, ds_op, args.calls))
+    results.update(bench_create_operator(api, mean_cls[0], args.calls // 4))
+    mean_op = api.call('create_operator_instance', mean_cls[1])['op_id']
+    results.update(bench_create_link(api, ds_op, mean_op, args.calls // 4))
+    api.call('delete_operator_instance', mean_op)
+    results.update(bench_pages(api, ds_op, args.rows))
+    results['same_daemon'] = bench_throughput(api, ds_op, mean_cls[0], args.rows, args.repeat)
+    results['cross_daemon'] = bench_throughput(api, ds_op, mean_cls[1], args.rows, args.repeat)
+    api.call('delete_operator_instance', ds_op)
+    return results
+
+def main():
+    args = parse_args()
+    tmp_dir = tempfile.mkdtemp(prefix = 'sakura-bench.')
+    dataset_path = os.path.join(tmp_dir, 'bench.csv')
+    generate_dataset(dataset_path, args.rows)
+    backend = Backend(args, tmp_dir, dataset_path)
+    try:
+        backend.start()
+        api = WebAPI(args.web_port)
+        try:
+            results = run(args, api)
+        finally:
+            api.close()
+    finally:
+        backend.stop()
+        if args.keep_logs:
+            print('Logs and conf files kept in %s' % tmp_dir, file = sys.stderr)
+        else:
+            shutil.rmtree(tmp_dir)
+    output = dict(
+        meta = dict(time = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                    host = platform.node(),
+                    python = platform.python_version(),
+                    cpus = os.cpu_count(),
+                    rows = args.rows,
+                    repeat = args.repeat,
+                    calls = args.calls),
+        results = results)
+    if args.output == None:
+        json.dump(output, sys.stdout, indent = 4)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent = 4)
+
+if __name__ == '__main__':
+    main()
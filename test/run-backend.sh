@@ -32,9 +32,9 @@ trap on_exit EXIT
 # output.
 prefix_out HUB test/run-hub.sh &
 sleep 1
-prefix_out DAEMON0 test/run-daemon.sh 0 datasample &
+prefix_out DAEMON0 test/run-daemon.sh 0 datasample dataset &
 sleep 0.2
-prefix_out DAEMON1 test/run-daemon.sh 1 mean map &
+prefix_out DAEMON1 test/run-daemon.sh 1 mean map aggregate &
 
 # wait for background processes to complete
 wait
@@ -27,7 +27,8 @@ cat > $TMPDIR/daemon.conf << EOF
     "hub-port": 10432,
     "daemon-desc": "daemon $daemon_index",
     "operators-dir": "$TMPDIR/operators",
-    "external-datasets": [ ]
+    "data-port": $((10440 + daemon_index)),
+    "external-datasets": [ "$(pwd)/test/datasets/people.csv" ]
 }
 EOF
 
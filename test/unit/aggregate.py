@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+import os, sys
+os.environ['UNIT_TEST'] = 'yes'
+sys.path.insert(0, '.')
+import numpy as np
+from sakura.daemon.processing.aggregate import Count, Sum, Mean, MinMax, \
+            Variance, Histogram
+
+# each aggregate is computed on chunks of values, then on partitions
+# of the values merged together (see partition.py): results must be
+# the same.
+# null and infinite values are ignored.
+
+print("""
+Expected results:
+---
+Count [(8,)] True
+Sum [(28.0,)] True
+Mean [(3.5,)] True
+MinMax [(0.0, 7.0)] True
+Variance [(5.25, 2.29128784747792)] True
+Histogram [(0.0, 0.125, 1), (7.0, 7.125, 1)] 8 True
+Count [(0,)] [(None,)] [(None,)] [(None, None)] []
+Count [(3,)] [(0.0,)]
+MinMax [(-1e+308, 1e+308)]
+Sum [(1.8446744073709552e+19,)] <class 'float'>
+Histogram (-1.0112023883600527e+308, 1e+308, 1e+308) 3 True
+Histogram [(1.0, 1.125, 1), (5.0, 5.125, 1)]
+
+Running test:
+---\
+""")
+
+def compute(cls, chunks):
+    aggregate = cls()
+    for chunk in chunks:
+        aggregate.update(chunk)
+    return aggregate
+
+def merged(cls, partitions):
+    partials = [ compute(cls, [ partition ]) for partition in partitions ]
+    result = partials[0]
+    for partial in partials[1:]:
+        result.merge(partial)
+    return result
+
+values = np.array([ 0.0, 1.0, np.nan, 2.0, 3.0, np.inf, 4.0, 5.0, -np.inf, 6.0, 7.0 ])
+chunks = [ values[:4], values[4:7], values[7:] ]
+partitions = [ values[:2], values[2:] ]
+for cls in (Count, Sum, Mean, MinMax, Variance, Histogram):
+    rows = compute(cls, chunks).rows()
+    same = merged(cls, partitions).rows() == rows
+    if cls is Histogram:
+        print(cls.__name__, [ rows[0], rows[-1] ], sum(row[2] for row in rows), same)
+    else:
+        print(cls.__name__, rows, same)
+
+# only null or infinite values
+empty = np.array([ np.nan, np.inf ])
+print('Count', compute(Count, [ empty ]).rows(), compute(Sum, [ empty ]).rows(),
+      compute(Mean, [ empty ]).rows(), compute(MinMax, [ empty ]).rows(), compute(Histogram, [ empty ]).rows())
+
+# largest floats (vmax - vmin overflows)
+big = np.array([ -1e308, 1e308, 0.0 ])
+print('Count', compute(Count, [ big ]).rows(), compute(Sum, [ big ]).rows())
+print('MinMax', compute(MinMax, [ big ]).rows())
+# largest ints (int64 sum overflows)
+rows = compute(Sum, [ np.array([ 2**63 - 1, 2**63 - 1, 2 ], np.int64) ]).rows()
+print('Sum', rows, type(rows[0][0]))
+small = np.arange(10.0)
+histogram = compute(Histogram, [ small, big ])
+rows = histogram.rows()
+print('Histogram', (rows[0][0], rows[-1][0] < 1e308 <= rows[-1][1] and 1e308,
+        1e308), len([ row for row in rows if row[2] > 0 ]),
+        merged(Histogram, [ small, big ]).rows() == rows)
+
+# int column with missing values (object array, see chunk.py)
+rows = compute(Histogram, [ np.array([ 1, None, 5 ], object) ]).rows()
+print('Histogram', [ row for row in rows if row[2] > 0 ])
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+import os, sys
+os.environ['UNIT_TEST'] = 'yes'
+sys.path.insert(0, '.')
+from sakura.daemon.processing.operator import Operator
+from sakura.daemon.processing.chunk import Chunk
+
+print("""
+Expected results:
+---
+3 ['int64', 'float64', 'object', 'bool']
+[(1, 0.5, 'a', True), (2, 1.5, 'b', False), (3, 2.5, 'c', True)]
+[(2, 1.5, 'b', False)]
+['object', 'float64', 'object', 'object']
+[(1, None, 'a', None), (None, 1.5, None, False)]
+0 ['int64', 'float64', 'object', 'bool']
+
+Running test:
+---\
+""")
+
+class Source(Operator):
+    NAME = "Source"
+    SHORT_DESC = "Source."
+    TAGS = [ "testing" ]
+    def construct(self):
+        output = self.register_output('Rows', None)
+        output.add_column('Int', int)
+        output.add_column('Float', float)
+        output.add_column('Str', str)
+        output.add_column('Bool', bool)
+
+op = Source(0)
+op.construct()
+columns = op.output_streams[0].columns
+
+chunk = Chunk.from_rows([ (1, 0.5, 'a', True), (2, 1.5, 'b', False), (3, 2.5, 'c', True) ], columns)
+print(len(chunk), [ str(arr.dtype) for arr in chunk.arrays ])
+print(list(chunk.rows()))
+print(list(chunk[1:2].rows()))
+
+# missing values
+chunk = Chunk.from_rows([ (1, None, 'a', None), (None, 1.5, None, False) ], columns)
+print([ str(arr.dtype) for arr in chunk.arrays ])
+print([ tuple(None if value != value else value for value in row) \
+            for row in chunk.rows() ])  # (NaN -> None)
+
+chunk = Chunk.from_rows([], columns)
+print(len(chunk), [ str(arr.dtype) for arr in chunk.arrays ])
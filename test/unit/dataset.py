@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import os, sys, tempfile
+os.environ['UNIT_TEST'] = 'yes'
+sys.path.insert(0, '.')
+import sakura.daemon.conf as conf
+from sakura.daemon.processing.query import StreamQuery
+from sakura.operators.public.dataset.operator import DatasetOperator
+
+# the Dataset operator reads a CSV file converted to memory-mapped
+# column files (see dataset.py). Queries (see query.py) only read the
+# columns involved.
+
+print("""
+Expected results:
+---
+6 ['Name', 'Age', 'Gender', 'Height']
+[('John', 52, 'male', 175), ('Alice', 34, 'female', 184)]
+[('Alice', 184), ('Jane', 164), ('Emma', 169)] [0, 2, 3]
+[('Alice', 34, 'female', 184)] [0, 1, 2, 3]
+[(175,), (181,)] [1, 2, 3]
+[(34, 34), (31, 31)] [1]
+
+Running test:
+---\
+""")
+
+conf.external_datasets = [ 'test/datasets/people.csv' ]
+conf.datasets_cache_dir = tempfile.mkdtemp()
+
+op = DatasetOperator(0)
+op.construct()
+op.auto_fill_parameters()
+stream = op.output_streams[0]
+print(stream.length, [ col.label for col in stream.columns ])
+print(list(stream)[:2])
+
+# record the column files actually read
+class RecordingArrays(list):
+    def __getitem__(self, idx):
+        read.add(idx)
+        return list.__getitem__(self, idx)
+op.dataset.arrays = RecordingArrays(op.dataset.arrays)
+
+def query(*args):
+    read.clear()
+    rows = list(stream.rows(StreamQuery(*args)))
+    return rows, sorted(read)
+
+read = set()
+print(*query((0, 3), ((2, '=', 'female'),)))
+print(*query(None, ((3, '>', 180), (2, '!=', 'male'))))
+print(*query((3,), ((1, '>', 40), (2, '=', 'male'))))
+print(*query((1, 1), ((1, '<', 35), (1, '>', 30))))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+import os, sys, itertools
+os.environ['UNIT_TEST'] = 'yes'
+sys.path.insert(0, '.')
+from sakura.operators.internal.fragmentsource.operator import FragmentSourceOperator
+
+# the FragmentSourceOperator pulls rows from a cursor opened on a
+# remote daemon. Here, the remote daemon is simulated by RemoteAPI,
+# which may lose its cursors (like a daemon closing idle cursors) or
+# its connection.
+
+print("""
+Expected results:
+---
+True 2 {}
+True 4 {}
+True 2 {}
+ConnectionError 4 {}
+
+Running test:
+---\
+""")
+
+ROWS = 5000
+
+class RemoteAPI(object):
+    def __init__(self, lost_fetches = ()):
+        self.cursors = {}
+        self.opened = 0
+        self.fetches = 0
+        self.lost_fetches = lost_fetches    # fetches failing (ConnectionError)
+    def open_cursor(self, op_id, out_id, query = None):
+        self.opened += 1
+        self.cursors[self.opened] = iter(range(ROWS))
+        return self.opened, None   # (length unknown)
+    def fetch(self, cursor_id, n):
+        self.fetches += 1
+        if self.fetches in self.lost_fetches:
+            self.cursors.pop(cursor_id, None)
+            raise ConnectionError
+        it = self.cursors.get(cursor_id)
+        if it == None:
+            return None
+        rows = list(itertools.islice(it, n))
+        if len(rows) < n:
+            del self.cursors[cursor_id]
+        return rows
+    def close_cursor(self, cursor_id):
+        self.cursors.pop(cursor_id, None)
+
+def run(api, lose_at = ()):
+    op = FragmentSourceOperator.__new__(FragmentSourceOperator)
+    op.remote_op_id, op.remote_out_id = 0, 0
+    op.peer_endpoint = None
+    op.remote_daemon_api = api
+    rows = []
+    try:
+        for row in op.compute():
+            rows.append(row)
+            if len(rows) in lose_at:
+                api.cursors.clear()     # cursors closed by the remote daemon
+    except ConnectionError:
+        return 'ConnectionError', api.opened, api.cursors
+    return rows == list(range(ROWS)), api.opened, api.cursors
+
+# cursor lost once
+print(*run(RemoteAPI(), (1500,)))
+# cursor lost while skipping the rows already transmitted
+print(*run(RemoteAPI((4, 5)), (1500,)))
+# connection lost
+print(*run(RemoteAPI((3,))))
+# connection never recovers
+print(*run(RemoteAPI(range(3, 100))))
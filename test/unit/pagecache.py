@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+import os, sys
+os.environ['UNIT_TEST'] = 'yes'
+sys.path.insert(0, '.')
+from sakura.hub.pagecache import PageCache
+from sakura.operators.public.datasample.operator import DataSampleOperator
+from sakura.operators.public.mean.operator import MeanOperator
+
+# the page cache calls the operators of the daemons through the
+# RPC layer; here, we give it local operators.
+
+print("""
+Expected results:
+---
+[('Alice', 34, 'female', 184), ('Bob', 31, 'male', 156)]
+1
+None
+0
+[('Alice', 34, 'female', 184), ('Bob', 31, 'male', 156)]
+
+Running test:
+---\
+""")
+
+op0 = DataSampleOperator(0)
+op0.construct()
+op1 = MeanOperator(1)
+op1.construct()
+cache = PageCache()
+
+print(cache.get_range(op0, 'output_streams', 0, 1, 3))
+print(len(cache.pages))     # (one page: no read-ahead after the last page)
+# input stream not connected
+print(cache.get_range(op1, 'input_streams', 0, 0, 10))
+print(len([ key for key in cache.pages if key[0] == 1 ]))
+# once connected
+op1.input_streams[0].connect(op0.output_streams[0])
+cache.invalidate((1,))
+print(cache.get_range(op1, 'input_streams', 0, 1, 3))
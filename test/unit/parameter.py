@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+import os, sys
+os.environ['UNIT_TEST'] = 'yes'
+sys.path.insert(0, '.')
+from sakura.daemon.processing.operator import Operator
+from sakura.operators.public.mean.operator import MeanOperator
+
+# a column selected by a parameter belongs to the stream connected
+# to the input: when the input is connected to another stream, the
+# column at the same index in the new stream must be used.
+
+print("""
+Expected results:
+---
+[(2.0,)]
+False [(20.0,)]
+False (None,)
+True [(20.0,)]
+
+Running test:
+---\
+""")
+
+class Source(Operator):
+    NAME = "Source"
+    SHORT_DESC = "Source."
+    TAGS = [ "testing" ]
+    def __init__(self, op_id, factor):
+        super().__init__(op_id)
+        self.factor = factor
+    def construct(self):
+        output = self.register_output('Rows', self.compute)
+        output.add_column('Int', int)
+    def compute(self):
+        for i in range(5):
+            yield (i * self.factor,)
+
+src1, src2 = Source(0, 1), Source(1, 10)
+src1.construct()
+src2.construct()
+mean = MeanOperator(2)
+mean.construct()
+mean.input_streams[0].connect(src1.output_streams[0])
+mean.set_parameter_value(0, 0)
+print(list(mean.output_streams[0]))
+
+# reconnected: same value, but the column of src2 is used
+mean.input_streams[0].disconnect()
+mean.input_streams[0].connect(src2.output_streams[0])
+print(mean.set_parameter_value(0, 0), list(mean.output_streams[0]))
+
+# disconnected: no column selected
+mean.input_streams[0].disconnect()
+print(mean.parameters[0].selected(), mean.get_state()[1])
+mean.input_streams[0].connect(src2.output_streams[0])
+print(mean.parameters[0].selected(), list(mean.output_streams[0]))
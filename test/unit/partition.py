@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+import os, sys
+os.environ['UNIT_TEST'] = 'yes'
+sys.path.insert(0, '.')
+import numpy as np
+from sakura.daemon.processing.operator import Operator
+from sakura.daemon.processing.chunk import Chunk
+from sakura.daemon.processing.pool import process_pool
+from sakura.daemon.processing.partition import partition_planner, MIN_PARTITION_ROWS
+from sakura.operators.public.mean.operator import MeanOperator
+from sakura.operators.public.aggregate.operator import VarianceOperator
+
+# aggregates computed on partitions of their input in the process
+# pool (see partition.py), then merged, must give the same results
+# as the unpartitioned computation.
+# partitioning requires a source with a known length and a
+# compute_range_cb(): otherwise, the aggregate is computed as usual.
+
+print("""
+Expected results:
+---
+Mean 149999.500000 149999.500000
+Variance 7499999999.916667 7499999999.916667
+partitioned: 3 partition(s), 6 range read(s)
+unpartitioned: 0 range read(s)
+no range: None
+Mean 149999.500000 149999.500000
+Variance 7499999999.916667 7499999999.916667
+unknown length: None
+Mean 149999.500000 149999.500000
+Variance 7499999999.916667 7499999999.916667
+1 partition: None
+
+Running test:
+---\
+""")
+
+ROWS = 3 * MIN_PARTITION_ROWS
+CHUNK_ROWS = 10000
+
+class Source(Operator):
+    NAME = "Source"
+    SHORT_DESC = "Source."
+    TAGS = [ "testing" ]
+    RANGE = True
+    LENGTH = ROWS
+    def construct(self):
+        self.range_reads = 0
+        output = self.register_output('Rows', self.compute,
+                    self.compute_range if self.RANGE else None)
+        output.add_column('Value', float)
+        output.length = self.LENGTH
+    def compute(self):
+        for row_start in range(0, ROWS, CHUNK_ROWS):
+            yield self.chunk(row_start, row_start + CHUNK_ROWS)
+    def compute_range(self, row_start, row_end):
+        self.range_reads += 1
+        for start in range(row_start, row_end, CHUNK_ROWS):
+            yield self.chunk(start, min(start + CHUNK_ROWS, row_end))
+    def chunk(self, row_start, row_end):
+        return Chunk([ np.arange(row_start, row_end, dtype = np.float64) ])
+
+class NoRangeSource(Source):
+    RANGE = False
+
+class UnknownLengthSource(Source):
+    LENGTH = None
+
+def aggregate(cls, source):
+    op = cls(1)
+    op.construct()
+    op.input_streams[0].connect(source.output_streams[0])
+    op.parameters[0].set_value(0)
+    return op.output_streams[0]
+
+def results(source):
+    # partitioned (if possible), then unpartitioned
+    for cls in (MeanOperator, VarianceOperator):
+        stream = aggregate(cls, source)
+        partitioned = list(stream.run_compute_cb(partitioned = True))[0][0]
+        unpartitioned = list(stream.run_compute_cb(partitioned = False))[0][0]
+        print(cls.NAME, '%.6f' % partitioned, '%.6f' % unpartitioned)
+
+process_pool.configure(4)
+partition_planner.configure(4)
+
+source = Source(0)
+source.construct()
+plan = partition_planner.plan(aggregate(MeanOperator, source))
+results(source)
+# (3 partitions per aggregate: ROWS // MIN_PARTITION_ROWS)
+print('partitioned: %d partition(s), %d range read(s)' % (plan.num_partitions, source.range_reads))
+source.range_reads = 0
+list(aggregate(MeanOperator, source).run_compute_cb(partitioned = False))
+print('unpartitioned: %d range read(s)' % source.range_reads)
+
+# fallbacks
+for label, cls in (('no range', NoRangeSource), ('unknown length', UnknownLengthSource)):
+    source = cls(0)
+    source.construct()
+    print('%s:' % label, partition_planner.plan(aggregate(MeanOperator, source)))
+    results(source)
+
+partition_planner.configure(1)
+source = Source(0)
+source.construct()
+print('1 partition:', partition_planner.plan(aggregate(MeanOperator, source)))
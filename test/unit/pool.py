@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+import os, sys, gevent
+os.environ['UNIT_TEST'] = 'yes'
+sys.path.insert(0, '.')
+from sakura.operators.public.datasample.operator import DataSampleOperator
+from sakura.operators.public.mean.operator import MeanOperator
+from sakura.daemon.processing.pool import process_pool
+
+# operators computed in the process pool (see pool.py), with a pool
+# of a single worker: the Mean operator reads its input, computed by
+# another operator of the pool, and 2 such chains run concurrently.
+
+print("""
+Expected results:
+---
+[(169.75,), (169.75,)]
+1 worker(s), 1 idle
+
+Running test:
+---\
+""")
+
+process_pool.configure(1)
+
+def chain():
+    op0 = DataSampleOperator(0)
+    op0.construct()
+    op0.EXEC_MODE = 'process'
+    op1 = MeanOperator(1)
+    op1.construct()
+    op1.EXEC_MODE = 'process'
+    op1.input_streams[0].connect(op0.output_streams[0])
+    op1.parameters[0].set_value(1)  # 'Height' column
+    return op1.output_streams[0]
+
+greenlets = [ gevent.spawn(lambda stream: list(stream)[0], chain()) for i in range(2) ]
+gevent.joinall(greenlets, timeout = 10)
+print([ g.value for g in greenlets ])   # (None if deadlocked)
+print('%d worker(s), %d idle' % (process_pool.num_workers, process_pool.idle_workers.qsize()))
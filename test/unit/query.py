@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+import os, sys, gevent
+os.environ['UNIT_TEST'] = 'yes'
+sys.path.insert(0, '.')
+from sakura.daemon.processing.operator import Operator
+from sakura.daemon.processing.query import StreamQuery
+from sakura.daemon.processing.cache import stream_cache
+
+# queries (see query.py) restrict the columns and rows of a stream.
+# The first source computes queries itself (compute_query_cb), the
+# second one lets them be applied to its output.
+
+print("""
+Expected results:
+---
+[(0, 'a'), (1, 'b'), (2, 'c'), (3, 'a'), (4, 'b')]
+[('a',), ('b',), ('c',)] [((1,), ())]
+[(3, 'a')] [(None, ((0, '>', 2), (1, '=', 'a')))]
+[(0,), (3,)]
+[['a', 'b', 'a', 'b'], [0, 1, 3, 4]] [((1, 0), ((1, '!=', 'c'),))]
+[(1, 'b'), (2, 'c')] [(0, 'a'), (1, 'b')]
+[(3,), (4,)]
+['a', 'b'] ['a', 'b'] 1 call(s)
+[0, 1, 2, 3, 4] [0, 1, 2, 3, 4] 0 call(s), 1 full computation(s)
+[(4,)] 0 call(s), 2 full computation(s)
+([0, 2], ['a', 'c'])
+
+Running test:
+---\
+""")
+
+ROWS = [ (0, 'a'), (1, 'b'), (2, 'c'), (3, 'a'), (4, 'b') ]
+
+class Source(Operator):
+    NAME = "Source"
+    SHORT_DESC = "Source."
+    TAGS = [ "testing" ]
+    def construct(self):
+        self.queries = []
+        self.computed = 0
+        output = self.register_output('Rows', self.compute, None,
+                                      self.compute_query)
+        output.add_column('Int', int)
+        output.add_column('Str', str)
+    def compute(self):
+        self.computed += 1
+        for row in ROWS:
+            gevent.sleep(0)
+            yield row
+    def compute_query(self, query):
+        self.queries.append(query.get_serializable())
+        for row in ROWS:
+            gevent.sleep(0)
+            if query.matches(row):
+                yield query.apply_row(row)
+
+class PlainSource(Source):
+    def construct(self):
+        self.computed = 0
+        output = self.register_output('Rows', self.compute)
+        output.add_column('Int', int)
+        output.add_column('Str', str)
+
+source = Source(0)
+source.construct()
+stream = source.output_streams[0]
+print(list(stream))
+
+# projection pushed down
+print(list(stream.rows(StreamQuery((1,))))[:3], source.queries)
+
+# predicates pushed down
+source.queries = []
+print(list(stream.rows(StreamQuery(None, ((0, '>', 2), (1, '=', 'a'))))), source.queries)
+print(list(stream.rows(StreamQuery.load(((0,), ((1, '=', 'a'),))))))
+
+# projection and predicate, chunks
+source.queries = []
+chunks = stream.chunks(query = StreamQuery((1, 0), ((1, '!=', 'c'),)))
+print([ arr.tolist() for arr in next(chunks).arrays ], source.queries)
+
+# query applied to the output of compute_cb()
+plain = PlainSource(1)
+plain.construct()
+plain_stream = plain.output_streams[0]
+print(list(plain_stream.rows(StreamQuery(None, ((0, '>=', 1), (0, '<', 3))))),
+      list(plain_stream.rows(StreamQuery(None, ((1, '<', 'c'),))))[:2])
+print(list(plain_stream.rows(StreamQuery((0,), ((0, '>', 2),)))))
+
+# concurrent iterations with the same query share the computation
+source.queries = []
+col = stream.columns[1]
+greenlets = [ gevent.spawn(list, iter(col)) for i in range(2) ]
+gevent.joinall(greenlets)
+print(greenlets[0].value[:2], greenlets[1].value[:2], '%d call(s)' % len(source.queries))
+
+# if the whole stream is being scanned, queries use this scan
+source.queries = []
+source.computed = 0
+rows = iter(stream)
+ints = iter(stream.columns[0])
+greenlets = [ gevent.spawn(list, rows), gevent.spawn(list, ints) ]
+gevent.joinall(greenlets)
+print([ row[0] for row in greenlets[0].value ], greenlets[1].value,
+      '%d call(s), %d full computation(s)' % (len(source.queries), source.computed))
+
+# ... or cached
+stream_cache.configure(1000000)
+list(stream)
+print(list(stream.rows(StreamQuery((0,), ((0, '>', 3),)))),
+      '%d call(s), %d full computation(s)' % (len(source.queries), source.computed))
+stream_cache.configure(0)
+
+# columns of an input stream
+consumer = PlainSource(2)
+consumer.construct()
+consumer.register_input('Input')
+consumer.input_streams[0].connect(plain_stream)
+print(([ v for v in consumer.input_streams[0].columns[0] if v % 2 == 0 ][:2],
+       list(consumer.input_streams[0].columns[1])[:3:2]))
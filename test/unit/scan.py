@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+import os, sys, gevent
+os.environ['UNIT_TEST'] = 'yes'
+sys.path.insert(0, '.')
+from sakura.daemon.processing.operator import Operator
+
+# 2 columns of a stream read by a greenlet (column B is started, then
+# column A is read entirely, then the rest of column B), while another
+# greenlet reads the whole stream: the 3 consumers share the same scan
+# (see scan.py). The first greenlet is the slowest, thus the second
+# one pulls items while the buffer of column B is full and the first
+# greenlet waits for items of column A.
+
+print("""
+Expected results:
+---
+(1999000, 3998000)
+1999000
+computed 1 time(s)
+
+Running test:
+---\
+""")
+
+ROWS = 2000
+
+class Source(Operator):
+    NAME = "Source"
+    SHORT_DESC = "Source."
+    TAGS = [ "testing" ]
+    def construct(self):
+        self.computed = 0
+        output = self.register_output('Rows', self.compute)
+        output.add_column('A', int)
+        output.add_column('B', int)
+    def compute(self):
+        self.computed += 1
+        for i in range(ROWS):
+            yield (i, 2 * i)
+
+op = Source(0)
+op.construct()
+stream = op.output_streams[0]
+
+def read_columns():
+    col_a, col_b = iter(stream.columns[0]), iter(stream.columns[1])
+    sum_b = next(col_b)
+    sum_a = 0
+    for a in col_a:
+        sum_a += a
+        gevent.sleep(0)
+        gevent.sleep(0)
+    sum_b += sum(col_b)
+    return sum_a, sum_b
+
+def read_rows():
+    sum_a = 0
+    for row in stream:
+        sum_a += row[0]
+        gevent.sleep(0)
+    return sum_a
+
+g1 = gevent.spawn(read_columns)
+g2 = gevent.spawn(read_rows)
+gevent.joinall((g1, g2), timeout = 10)
+print(g1.value)     # (None if deadlocked)
+print(g2.value)
+print('computed %d time(s)' % op.computed)
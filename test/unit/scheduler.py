@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+import os, sys, gevent
+os.environ['UNIT_TEST'] = 'yes'
+sys.path.insert(0, '.')
+from sakura.hub.web.scheduler import GuiScheduler
+
+# when a websocket is closed, the bulk calls still running or waiting
+# (ranges of rows) are interrupted, but control calls complete.
+# A batch of calls is a control call if one of its calls is.
+
+print("""
+Expected results:
+---
+running: [1, 2, 3, 5]
+completed: [1, 3, 5]
+0 client(s), 0 active request(s)
+
+Running test:
+---\
+""")
+
+scheduler = GuiScheduler()
+scheduler.configure(2, None)
+connection = scheduler.connection('client')
+running, completed = [], []
+
+def request(req_id, path, args, kwargs, bytes_in):
+    running.append(req_id)
+    gevent.sleep(0.1)
+    completed.append(req_id)
+
+def call(path):
+    return (path, (), {})
+
+connection.spawn(request, 1, ('set_parameter_value',), (), {}, 0)
+connection.spawn(request, 2, ('get_operator_output_range',), (), {}, 0)
+connection.spawn(request, 3, ('create_link',), (), {}, 0)  # (waits for a slot)
+connection.spawn(request, 4, ('get_operator_input_range',), (), {}, 0)
+connection.spawn(request, 5, None, [ call(('get_operator_output_range',)),
+                                     call(('list_daemons',)) ], {}, 0)
+connection.spawn(request, 6, None, [ call(('get_operator_input_range',)),
+                                     call(('get_operator_output_range',)) ], {}, 0)
+gevent.sleep(0.05)
+connection.close()
+gevent.sleep(0.5)
+print('running:', sorted(running))
+print('completed:', sorted(completed))
+print('%d client(s), %d active request(s)' % (len(scheduler.clients),
+            sum(scheduler.slots.active.values())))
@@ -4,6 +4,15 @@ var callbacks = {};
 var next_cb_idx = 0;
 var free_ws = [];
 
+// responses are received in binary format, compressed if the
+// browser can decompress them (see sakura/hub/web/codec.py).
+var ws_compress = (typeof DecompressionStream !== 'undefined');
+
+// the websockets of this page share the per-client request limits
+// of the hub (see sakura/hub/web/scheduler.py).
+var ws_session = Date.now().toString(36) + '-' +
+                 Math.random().toString(36).substring(2);
+
 function get_ws_url() {
     var loc = window.location, proto;
     if (loc.protocol === "https:") {
@@ -11,14 +20,126 @@ function get_ws_url() {
     } else {
         proto = "ws:";
     }
-    return proto + "//" + loc.host + "/websockets/rpc";
+    var query = "?format=binary&session=" + ws_session;
+    if (ws_compress) {
+        query += "&compress=deflate";
+    }
+    return proto + "//" + loc.host + "/websockets/rpc" + query;
 }
 
-function ws_onmessage(evt) {
-    // parse the message
-    var json = JSON.parse(evt.data);
-    var cb_idx = json[0];
-    var result = json[1];
+// binary decoding
+var BIN_NULL = 0, BIN_FALSE = 1, BIN_TRUE = 2, BIN_INT = 3, BIN_FLOAT = 4,
+    BIN_STR = 5, BIN_LIST = 6, BIN_DICT = 7, BIN_TABLE = 8;
+var BIN_COL_INT = 0, BIN_COL_FLOAT = 1, BIN_COL_STR = 2, BIN_COL_ANY = 3;
+var BIN_FLAG_COMPRESSED = 1;
+var utf8_decoder = new TextDecoder('utf-8');
+
+function BinaryReader(buf) {
+    this.buf = buf;
+    this.view = new DataView(buf);
+    this.pos = 0;
+}
+
+BinaryReader.prototype.uint8 = function() {
+    return this.view.getUint8(this.pos++);
+};
+
+BinaryReader.prototype.uint32 = function() {
+    var val = this.view.getUint32(this.pos, true);
+    this.pos += 4;
+    return val;
+};
+
+BinaryReader.prototype.int32 = function() {
+    var val = this.view.getInt32(this.pos, true);
+    this.pos += 4;
+    return val;
+};
+
+BinaryReader.prototype.float64 = function() {
+    var val = this.view.getFloat64(this.pos, true);
+    this.pos += 8;
+    return val;
+};
+
+BinaryReader.prototype.str = function(len) {
+    var val = utf8_decoder.decode(new Uint8Array(this.buf, this.pos, len));
+    this.pos += len;
+    return val;
+};
+
+function decode_column(reader, rows, col) {
+    var i, num_rows = rows.length, col_tag = reader.uint8();
+    if (col_tag == BIN_COL_INT) {
+        for (i = 0; i < num_rows; i++) { rows[i][col] = reader.int32(); }
+    } else if (col_tag == BIN_COL_FLOAT) {
+        for (i = 0; i < num_rows; i++) { rows[i][col] = reader.float64(); }
+    } else if (col_tag == BIN_COL_STR) {
+        var lengths = [];
+        for (i = 0; i < num_rows; i++) { lengths.push(reader.uint32()); }
+        for (i = 0; i < num_rows; i++) { rows[i][col] = reader.str(lengths[i]); }
+    } else {
+        for (i = 0; i < num_rows; i++) { rows[i][col] = decode_value(reader); }
+    }
+}
+
+function decode_value(reader) {
+    var i, len, res, tag = reader.uint8();
+    switch (tag) {
+        case BIN_NULL:  return null;
+        case BIN_FALSE: return false;
+        case BIN_TRUE:  return true;
+        case BIN_INT:   return reader.int32();
+        case BIN_FLOAT: return reader.float64();
+        case BIN_STR:   return reader.str(reader.uint32());
+        case BIN_LIST:
+            len = reader.uint32();
+            res = [];
+            for (i = 0; i < len; i++) { res.push(decode_value(reader)); }
+            return res;
+        case BIN_DICT:
+            len = reader.uint32();
+            res = {};
+            for (i = 0; i < len; i++) {
+                var key = decode_value(reader);
+                res[key] = decode_value(reader);
+            }
+            return res;
+        case BIN_TABLE:
+            len = reader.uint32();
+            var num_cols = reader.uint8();
+            res = [];
+            for (i = 0; i < len; i++) { res.push(new Array(num_cols)); }
+            for (i = 0; i < num_cols; i++) { decode_column(reader, res, i); }
+            return res;
+    }
+    throw new Error('unknown tag ' + tag + ' in binary message');
+}
+
+function inflate(buf) {
+    var stream = new Blob([buf]).stream().pipeThrough(
+                        new DecompressionStream('deflate'));
+    return new Response(stream).arrayBuffer();
+}
+
+// returns a promise of the decoded message
+function decode_message(buf) {
+    var flags = new Uint8Array(buf, 0, 1)[0];
+    var payload = buf.slice(1);
+    var decoded;
+    if (flags & BIN_FLAG_COMPRESSED) {
+        decoded = inflate(payload);
+    } else {
+        decoded = Promise.resolve(payload);
+    }
+    return decoded.then(function(payload) {
+        return decode_value(new BinaryReader(payload));
+    });
+}
+
+function ws_onresult(msg) {
+    var cb_idx = msg[0];
+    var result = msg[1];
     var callback = callbacks[cb_idx];
     // callbacks[cb_idx] will no longer be needed
     delete callbacks[cb_idx];
@@ -28,6 +149,15 @@ function ws_onmessage(evt) {
     callback(result);
 }
 
+function ws_onmessage(evt) {
+    // parse the message
+    if (typeof evt.data === 'string') {
+        ws_onresult(JSON.parse(evt.data));
+    } else {
+        decode_message(evt.data).then(ws_onresult);
+    }
+}
+
 function ws_request(func_name, args, kwargs, callback)
 {
     var ws;
@@ -35,6 +165,7 @@ function ws_request(func_name, args, kwargs, callback)
     if (free_ws.length == 0)
     {   // existing websockets are busy, create new one
         ws = new WebSocket(get_ws_url());
+        ws.binaryType = 'arraybuffer';
         ws.onmessage = ws_onmessage;
         ws.onopen = function() {
             free_ws.push(ws);